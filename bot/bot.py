@@ -1,66 +1,223 @@
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
+"""Telegram bot setup for AMIRA
+
+This module builds the python-telegram-bot Application and registers the
+conversation handlers. Updates are received either by long polling, where idle
+getUpdates requests are held open by Telegram instead of being repeated, or by
+a webhook, where Telegram pushes each update to the bot directly:
+
+    application = setup_bot(db, run_mode='webhook')
+    run_bot(application)
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import redis.asyncio as aioredis
+from telegram.ext import AIORateLimiter, ApplicationBuilder, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
 from loguru import logger
 
 # Import configuration
 import config
 
+# Import patient profile cache and conversation persistence
+from data.cache import CachedUserStore
+from bot.persistence import RedisPersistence
+from bot.update_processor import PerChatUpdateProcessor
+
+# Use uvloop's faster event loop when it is installed
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
+
 # Import handlers
 from bot.handlers import (
-    start_handler, help_handler, message_handler, 
+    ConvState, start_handler, help_handler, message_handler, 
     register_handler, condition_handler, end_conversation_handler,
     callback_query_handler,language_handler, nationality_handler, age_handler, education_handler
 )
 
-def setup_bot(db):
+# Shared filter for plain text replies (commands excluded)
+TEXT_ONLY = filters.TEXT & ~filters.COMMAND
+
+# Callback data sent by the condition selection keyboard
+CONDITION_PATTERN = f"^({'|'.join(config.SUPPORTED_CONDITIONS)}|unknown)$"
+
+def setup_bot(db, poll_interval=0.0, long_poll_timeout=25, run_mode='polling'):
     """Setup and configure the Telegram bot
     
+    All messages sent from handlers (reply_text, edit_message_text, ...) go
+    through a shared AIORateLimiter, so bursts are paced below Telegram's flood
+    limits instead of running into 429 responses.
+    
     Args:
-        db: MongoDB database connection
+        db: MongoDB database connection, backed by a single pooled client per process
+        poll_interval (float, optional): Delay in seconds between getUpdates calls
+        long_poll_timeout (int, optional): Seconds Telegram holds an idle getUpdates
+            request open before returning an empty result
+        run_mode (str, optional): 'polling' or 'webhook'
         
     Returns:
         telegram.ext.Application: Configured bot application
     """
-    # Create the Application
-    application = ApplicationBuilder().token(config.TELEGRAM_TOKEN).build()
+    if run_mode not in ('polling', 'webhook'):
+        raise ValueError(f"Unsupported run mode: {run_mode}")
+    if run_mode == 'webhook' and not config.WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set when running in webhook mode")
+    
+    # Create the Application, dispatching updates from different chats concurrently
+    # while keeping each chat's updates in order
+    builder = (
+        ApplicationBuilder()
+        .token(config.TELEGRAM_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor(config.CONCURRENT_UPDATES))
+        .rate_limiter(AIORateLimiter(overall_max_rate=28, overall_time_period=1, max_retries=3))
+        # Multiplex Bot API calls over HTTP/2. The pool matches PTB's default of
+        # 256 at the default CONCURRENT_UPDATES and follows it when raised.
+        # getUpdates is a single long poll, so it stays on HTTP/1.1
+        .http_version('2')
+        .connection_pool_size(config.CONCURRENT_UPDATES)
+        .connect_timeout(5)
+        .read_timeout(30)
+        .write_timeout(30)
+        .pool_timeout(2)
+        .post_init(_install_db_executor)
+        .post_shutdown(_shutdown_executor)
+    )
+    
+    # Keep conversation state in Redis when it is configured
+    redis_client = aioredis.from_url(config.REDIS_URL) if config.REDIS_URL else None
+    if redis_client is not None:
+        builder.persistence(RedisPersistence(redis_client))
+    application = builder.build()
     
-    # Add conversation handler with states
+    # Add conversation handler with states. Handlers block within their chat so
+    # the update processor can keep each conversation in order; other chats are
+    # not held up by a slow LLM call
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start_handler)],
         states={
-            'LANGUAGE': [
+            ConvState.LANGUAGE: [
                 CallbackQueryHandler(language_handler)
             ],
-            'REGISTER': [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, register_handler)
+            ConvState.REGISTER: [
+                MessageHandler(TEXT_ONLY, register_handler)
             ],
-            'NATIONALITY': [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, nationality_handler)
+            ConvState.NATIONALITY: [
+                MessageHandler(TEXT_ONLY, nationality_handler)
             ],
-            'AGE': [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, age_handler)
+            ConvState.AGE: [
+                MessageHandler(TEXT_ONLY, age_handler)
             ],
-            'EDUCATION': [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, education_handler)
+            ConvState.EDUCATION: [
+                MessageHandler(TEXT_ONLY, education_handler)
             ],
-            'CONDITION': [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, condition_handler),
-                CallbackQueryHandler(callback_query_handler)
+            ConvState.CONDITION: [
+                MessageHandler(TEXT_ONLY, condition_handler),
+                CallbackQueryHandler(condition_handler, pattern=CONDITION_PATTERN)
             ],
-            'CONVERSATION': [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler),
-                CallbackQueryHandler(callback_query_handler)
+            ConvState.CONVERSATION: [
+                MessageHandler(TEXT_ONLY, message_handler)
             ],
         },
-        fallbacks=[CommandHandler('end', end_conversation_handler)],
+        fallbacks=[
+            CommandHandler('end', end_conversation_handler),
+            CommandHandler('help', help_handler)
+        ],
+        name='amira_conversation',
+        persistent=redis_client is not None,
     )
     
-    # Add handlers to the application
-    application.add_handler(conv_handler)
-    application.add_handler(CommandHandler('help', help_handler))
-    application.add_handler(CallbackQueryHandler(callback_query_handler))
+    # Add handlers to the application in one call, all in the default group so
+    # an update is handled at most once. /help during a conversation is answered
+    # by the fallback above, so the standalone handler only serves users outside
+    # a conversation. Button presses are routed by their callback data prefix;
+    # everything else goes to the menu callback handler. Like the conversation
+    # states these block, so the update processor keeps them in chat order
+    application.add_handlers([
+        conv_handler,
+        CommandHandler('help', help_handler),
+        CallbackQueryHandler(language_handler, pattern=r'^lang_'),
+        CallbackQueryHandler(condition_handler, pattern=CONDITION_PATTERN),
+        CallbackQueryHandler(callback_query_handler),
+    ])
     
-    # Store database connection in application
-    application.bot_data['db'] = db
+    # Warn when the database threads could exhaust the MongoDB connection pool
+    max_pool_size = db.client.options.pool_options.max_pool_size
+    if max_pool_size is not None and max_pool_size < config.DB_WORKERS:
+        logger.warning(
+            "MongoDB maxPoolSize ({}) is lower than DB_WORKERS ({}); "
+            "handlers may queue waiting for connections",
+            max_pool_size, config.DB_WORKERS
+        )
+    
+    # Store database connection in application, behind the Redis profile cache
+    application.bot_data['db'] = CachedUserStore(db, redis_client, ttl=config.PROFILE_CACHE_TTL)
+    
+    # Thread pool for the blocking Gemini SDK calls made by message handlers
+    application.bot_data['executor'] = ThreadPoolExecutor(
+        max_workers=config.AI_WORKERS,
+        thread_name_prefix='amira-ai'
+    )
     
-    logger.info("Telegram bot configured successfully")
-    return application
\ No newline at end of file
+    # Store how updates should be received, used by run_bot()
+    application.bot_data['run_mode'] = run_mode
+    application.bot_data['polling'] = {
+        'poll_interval': poll_interval,
+        'timeout': long_poll_timeout
+    }
+    
+    logger.info("Telegram bot configured successfully (uvloop: {})", 'enabled' if uvloop else 'disabled')
+    return application
+
+async def _install_db_executor(application):
+    """Size the event loop's default executor for handler database calls
+    
+    Handlers make their blocking MongoDB calls through asyncio.to_thread,
+    which runs on the default executor. Its stock size of min(32, CPUs + 4)
+    threads depends on the machine, so it is set to DB_WORKERS instead. Each
+    call is a short indexed query, so a few dozen threads keep up with the
+    bot. The loop shuts the executor down when it is closed.
+    
+    Args:
+        application (telegram.ext.Application): The starting application
+    """
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(
+        max_workers=config.DB_WORKERS,
+        thread_name_prefix='amira-db'
+    ))
+
+async def _shutdown_executor(application):
+    """Stop the AI thread pool once the application has shut down
+    
+    Args:
+        application (telegram.ext.Application): The stopping application
+    """
+    executor = application.bot_data.get('executor')
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def run_bot(application):
+    """Run the bot until it is stopped, using the run mode chosen in setup_bot
+    
+    Args:
+        application (telegram.ext.Application): Application returned by setup_bot
+    """
+    if application.bot_data['run_mode'] == 'webhook':
+        # Telegram pushes updates to us; max_connections lets it deliver them in parallel
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.TELEGRAM_TOKEN,
+            webhook_url=f"{config.WEBHOOK_URL}/{config.TELEGRAM_TOKEN}",
+            secret_token=config.WEBHOOK_SECRET,
+            max_connections=100
+        )
+    else:
+        polling = application.bot_data['polling']
+        application.run_polling(
+            poll_interval=polling['poll_interval'],
+            timeout=polling['timeout'],
+            bootstrap_retries=-1
+        )
\ No newline at end of file
@@ -1,8 +1,12 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from loguru import logger
+import asyncio
 import datetime
-from bson import ObjectId
+import functools
+import re
+from collections import Counter
+from enum import IntEnum
 
 # Import configuration
 import config
@@ -12,24 +16,165 @@ from core.ai_therapist import AITherapist
 from core.emotion_analyzer import EmotionAnalyzer
 from core.localization import Localization
 from core.letting_go import LettingGoTechnique
-from core.session_manager import SessionManager
+from core.session_manager import SessionManager, new_session_id
 from data.models import Patient, Session, Interaction
 
 # Import reporting module
 from reporting.report_generator import ReportGenerator
 
-# Initialize AI components
-ai_therapist = AITherapist()
-emotion_analyzer = EmotionAnalyzer()
+# AI components are created on first use, so importing the handlers does not
+# configure Gemini or build the models
+@functools.lru_cache(maxsize=None)
+def get_ai_therapist():
+    """Get the shared AITherapist, creating it on first use
 
-# Initialize localization with default language
-localization = Localization(config.DEFAULT_LANGUAGE)
+    Returns:
+        AITherapist: The AI therapist shared by all handlers
+    """
+    return AITherapist()
+
+@functools.lru_cache(maxsize=None)
+def get_emotion_analyzer():
+    """Get the shared EmotionAnalyzer, creating it on first use
+
+    Returns:
+        EmotionAnalyzer: The emotion analyzer shared by all handlers
+    """
+    return EmotionAnalyzer()
+
+# One localization bundle and letting go technique per supported language,
+# shared by all users instead of switching a single global instance
+LOCALIZATIONS = {code: Localization(code) for code in config.SUPPORTED_LANGUAGES}
+LETTING_GO = {code: LettingGoTechnique(LOCALIZATIONS[code]) for code in config.SUPPORTED_LANGUAGES}
+
+def L(lang):
+    """Get the shared Localization for a language code
+
+    Args:
+        lang (str): Language code ('en' or 'ar')
 
-# Initialize letting go technique
-letting_go = LettingGoTechnique(localization)
+    Returns:
+        Localization: Localization for the language, or the default language
+    """
+    return LOCALIZATIONS.get(lang, LOCALIZATIONS[config.DEFAULT_LANGUAGE])
+
+@functools.lru_cache(maxsize=1024)
+def _progress_keyboard(lang, patient_id_hex):
+    """Get the progress tracking keyboard for a patient, built once per patient
+
+    Args:
+        lang (str): Language code ('en' or 'ar')
+        patient_id_hex (str): Patient ID sent in the callback data
+
+    Returns:
+        InlineKeyboardMarkup: Keyboard with the progress tracking button
+    """
+    return LETTING_GO[lang].get_progress_keyboard(patient_id_hex)
+
+# Keyboards that never change, built once (per language where they are localized)
+START_MENU_KB = {
+    code: InlineKeyboardMarkup([
+        [InlineKeyboardButton(loc.get_text('view_progress'), callback_data="view_progress")],
+        [InlineKeyboardButton(loc.get_text('get_report'), callback_data="get_report")],
+        [InlineKeyboardButton(loc.get_text('letting_go'), callback_data="letting_go")],
+        [
+            InlineKeyboardButton(lang_name, callback_data=f"lang_{lang_code}")
+            for lang_code, lang_name in config.SUPPORTED_LANGUAGES.items()
+        ]
+    ])
+    for code, loc in LOCALIZATIONS.items()
+}
+RETURNING_USER_KB = {
+    code: InlineKeyboardMarkup([
+        [InlineKeyboardButton(loc.get_text('view_progress'), callback_data="view_progress")],
+        [InlineKeyboardButton(loc.get_text('get_report'), callback_data="get_report")],
+        [InlineKeyboardButton(loc.get_text('continue_conversation'), callback_data="continue_conversation")]
+    ])
+    for code, loc in LOCALIZATIONS.items()
+}
+LANGUAGE_KB_NEW = InlineKeyboardMarkup([
+    [InlineKeyboardButton(lang_name, callback_data=f"lang_{lang_code}_new")]
+    for lang_code, lang_name in config.SUPPORTED_LANGUAGES.items()
+])
+CONDITIONS_KB = {
+    code: InlineKeyboardMarkup([
+        [InlineKeyboardButton(loc.get_text(condition), callback_data=condition)]
+        for condition in (*config.SUPPORTED_CONDITIONS, 'unknown')
+    ])
+    for code, loc in LOCALIZATIONS.items()
+}
+
+CONTINUE_KB = {
+    code: InlineKeyboardMarkup([
+        [InlineKeyboardButton(loc.get_text('continue_conversation'), callback_data="continue_conversation")]
+    ])
+    for code, loc in LOCALIZATIONS.items()
+}
+VIEW_PROGRESS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Get Detailed Report", callback_data="get_report")],
+    [InlineKeyboardButton("Continue Conversation", callback_data="continue_conversation")]
+])
+REPORT_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Continue Conversation", callback_data="continue_conversation")]
+])
+REPORT_UNAVAILABLE_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Continue", callback_data="continue_conversation")]
+])
+
+# Replies too short to need emotion analysis
+_TRIVIAL_MESSAGES = frozenset({
+    "yes", "no", "ok", "okay", "thanks", "thank you", "hi", "hello",
+    "اه", "ايوه", "لا", "تمام", "ماشي", "شكرا", "اهلا"
+})
+
+# Bold Markdown section headings of the session reports, per language
+REPORT_HEADINGS = {
+    code: {
+        key: f"*{loc.get_text(key)}*\n"
+        for key in (
+            'therapeutic_report_title', 'overall_assessment', 'summary', 'condition',
+            'emotional_trends', 'progress_indicators', 'recommendations'
+        )
+    }
+    for code, loc in LOCALIZATIONS.items()
+}
+
+# Session fields read by the report_ callback
+SESSION_REPORT_PROJECTION = {
+    "start_time": 1,
+    "end_time": 1,
+    "summary": 1,
+    "condition_classification": 1,
+    "metrics.recommendations": 1,
+    "interactions.emotion_analysis.primary_emotion": 1
+}
+
+# Emotion intensities reported by the emotion analyzer that call for the
+# letting go technique
+_LETTING_GO_INTENSITIES = frozenset({"high"})
+
+# Phrases that end the session when they appear anywhere in a message
+_END_RE = re.compile(r"that's it|بس كده|انتهيت|finished", re.IGNORECASE)
+
+# Progress bars for 0-100% in steps of 10%
+PROGRESS_BARS = tuple("█" * filled + "░" * (10 - filled) for filled in range(11))
 
 # Session manager will be initialized with the database connection when the bot starts
 
+# Lazy logger for per-update debug output: arguments are callables that are
+# only evaluated when DEBUG logging is enabled
+log = logger.opt(lazy=True)
+
+class ConvState(IntEnum):
+    """Conversation states used by the ConversationHandler"""
+    LANGUAGE = 0
+    REGISTER = 1
+    NATIONALITY = 2
+    AGE = 3
+    EDUCATION = 4
+    CONDITION = 5
+    CONVERSATION = 6
+
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the /start command to initiate conversation with the bot
     
@@ -38,84 +183,73 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     user = update.effective_user
     db = context.bot_data['db']
     
-    # Check if user is already registered
-    patient = db.patients.find_one({"telegram_id": user.id})
-    
-    # Set language preference if available
-    lang = config.DEFAULT_LANGUAGE
-    if patient and 'language' in patient:
-        lang = patient['language']
+    # Check if user is already registered and get their language preference
+    patient, lang = await _get_patient_language(context, user)
     
-    # Update localization
-    localization.switch_language(lang)
+    # Get localization for the user's language
+    localization = L(lang)
     
     if patient:
-        # Create keyboard with options
-        keyboard = [
-            [InlineKeyboardButton(localization.get_text('view_progress'), callback_data="view_progress")],
-            [InlineKeyboardButton(localization.get_text('get_report'), callback_data="get_report")],
-            [InlineKeyboardButton(localization.get_text('letting_go'), callback_data="letting_go")]
-        ]
+        # Initialize session manager if not already done
+        if "session_manager" not in context.bot_data:
+            context.bot_data["session_manager"] = SessionManager(db, lang)
         
-        # Add language selection buttons
-        language_buttons = []
-        for lang_code, lang_name in config.SUPPORTED_LANGUAGES.items():
-            language_buttons.append(
-                InlineKeyboardButton(lang_name, callback_data=f"lang_{lang_code}")
-            )
-        keyboard.append(language_buttons)
+        # Start fetching the previous session report so it loads while the
+        # greeting is sent
+        previous_report_task = asyncio.create_task(asyncio.to_thread(
+            context.bot_data["session_manager"].get_previous_session_report, patient["_id"]
+        ))
         
         # Send minimal greeting only if not already greeted
         if not context.user_data.get("greeted"):
-            await update.message.reply_text(
-                localization.get_text('welcome_back', name=patient['name']),
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            context.user_data["greeted"] = True
-        
-        # Initialize session manager if not already done
-        if "session_manager" not in context.bot_data:
-            context.bot_data["session_manager"] = SessionManager(db, lang)
+            try:
+                await update.message.reply_text(
+                    localization.get_text('welcome_back', name=patient['name']),
+                    reply_markup=START_MENU_KB[localization.language]
+                )
+            except Exception:
+                previous_report_task.cancel()
+                raise
             
         # Set greeting flag to ensure welcome message only appears once
         context.user_data["greeted"] = True
         
         # Check for previous session report
-        previous_report = context.bot_data["session_manager"].get_previous_session_report(patient["_id"])
+        previous_report = await previous_report_task
         
         # If there's a previous session report, show it
         if previous_report:
-            report_message = f"*{localization.get_text('therapeutic_report_title')}*\n\n"
-            report_message += f"{localization.get_text('using_since')}: {previous_report['session_date']}\n"
-            report_message += f"{localization.get_text('total_sessions')}: {previous_report['interaction_count']}\n\n"
-            
-            # Add summary
-            report_message += f"*{localization.get_text('overall_assessment')}*\n{previous_report['summary']}\n\n"
+            headings = REPORT_HEADINGS[localization.language]
+            parts = [
+                headings['therapeutic_report_title'], "\n",
+                f"{localization.get_text('using_since')}: {previous_report['session_date']}\n",
+                f"{localization.get_text('total_sessions')}: {previous_report['interaction_count']}\n\n",
+                # Add summary
+                headings['overall_assessment'], f"{previous_report['summary']}\n\n"
+            ]
             
             # Add emotional trends
             if previous_report['emotional_trends']:
-                report_message += f"*{localization.get_text('emotional_trends')}*\n"
-                for trend in previous_report['emotional_trends'][:3]:  # Show top 3 trends
-                    report_message += f"- {trend}\n"
-                report_message += "\n"
+                parts.append(headings['emotional_trends'])
+                parts.extend(f"- {trend}\n" for trend in previous_report['emotional_trends'][:3])  # Show top 3 trends
+                parts.append("\n")
             
             # Add progress indicators
             if previous_report['progress_indicators']:
-                report_message += f"*{localization.get_text('progress_indicators')}*\n"
-                for indicator in previous_report['progress_indicators']:
-                    report_message += f"- {indicator}\n"
-                report_message += "\n"
+                parts.append(headings['progress_indicators'])
+                parts.extend(f"- {indicator}\n" for indicator in previous_report['progress_indicators'])
+                parts.append("\n")
             
             # Add recommendations
             if previous_report['recommendations']:
-                report_message += f"*{localization.get_text('recommendations')}*\n"
-                for recommendation in previous_report['recommendations'][:2]:  # Show top 2 recommendations
-                    report_message += f"- {recommendation}\n"
+                parts.append(headings['recommendations'])
+                parts.extend(f"- {recommendation}\n" for recommendation in previous_report['recommendations'][:2])  # Show top 2 recommendations
+            report_message = "".join(parts)
             
             # Send the report
             await update.message.reply_text(
@@ -123,23 +257,19 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
                 parse_mode="Markdown"
             )
         
-        # Start a new session
+        # Start a new session; it is stored with its first interaction
         session = context.bot_data["session_manager"].start_session(patient["_id"])
         session["user_id"] = user.id
         session["language"] = lang
         context.user_data["session"] = session
-        return 'CONVERSATION'
+        return ConvState.CONVERSATION
     else:
         # Ask for language preference first
-        keyboard = []
-        for lang_code, lang_name in config.SUPPORTED_LANGUAGES.items():
-            keyboard.append([InlineKeyboardButton(lang_name, callback_data=f"lang_{lang_code}_new")])
-        
         await update.message.reply_text(
             "Please select your preferred language / من فضلك اختر لغتك المفضلة",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=LANGUAGE_KB_NEW
         )
-        return 'LANGUAGE'
+        return ConvState.LANGUAGE
 
 async def language_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle language selection
@@ -149,7 +279,7 @@ async def language_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     query = update.callback_query
     await query.answer()
@@ -162,8 +292,8 @@ async def language_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         parts = data.split("_")
         lang_code = parts[1]
         
-        # Update localization
-        localization.switch_language(lang_code)
+        # Get localization for the user's language
+        localization = L(lang_code)
         
         # Store language preference
         context.user_data["language"] = lang_code
@@ -174,33 +304,21 @@ async def language_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             await query.edit_message_text(
                 localization.get_text('welcome', name=query.from_user.first_name)
             )
-            return 'REGISTER'
+            return ConvState.REGISTER
         else:
             # Existing user changing language
             user = update.effective_user
             db = context.bot_data['db']
             
-            # Update language preference in database
-            db.patients.update_one(
-                {"telegram_id": user.id},
-                {"$set": {"language": lang_code}}
-            )
-            
-            # Get updated patient data
-            patient = db.patients.find_one({"telegram_id": user.id})
-            
-            # Create keyboard with options for returning users
-            keyboard = [
-                [InlineKeyboardButton(localization.get_text('view_progress'), callback_data="view_progress")],
-                [InlineKeyboardButton(localization.get_text('get_report'), callback_data="get_report")],
-                [InlineKeyboardButton(localization.get_text('continue_conversation'), callback_data="continue_conversation")]
-            ]
+            # Update language preference in database and cache
+            patient = await db.update_profile(user.id, {"language": lang_code})
             
+            # Show the options for returning users
             await query.edit_message_text(
                 localization.get_text('welcome_back', name=patient['name']),
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=RETURNING_USER_KB[localization.language]
             )
-            return 'CONVERSATION'
+            return ConvState.CONVERSATION
 
 async def register_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle user registration
@@ -210,18 +328,19 @@ async def register_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     # Store user's name
     name = update.message.text
     context.user_data["name"] = name
+    localization = L(context.user_data.get("language", config.DEFAULT_LANGUAGE))
     
     # Ask about nationality
     await update.message.reply_text(
         localization.get_text('ask_nationality', name=name)
     )
     
-    return 'NATIONALITY'
+    return ConvState.NATIONALITY
 
 async def nationality_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle nationality collection
@@ -231,18 +350,19 @@ async def nationality_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     # Store user's nationality
     nationality = update.message.text
     context.user_data["nationality"] = nationality
+    localization = L(context.user_data.get("language", config.DEFAULT_LANGUAGE))
     
     # Ask about age
     await update.message.reply_text(
         localization.get_text('ask_age')
     )
     
-    return 'AGE'
+    return ConvState.AGE
 
 async def age_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle age collection
@@ -252,7 +372,7 @@ async def age_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     # Store user's age
     try:
@@ -261,13 +381,14 @@ async def age_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     except ValueError:
         # If not a valid number, store as string
         context.user_data["age"] = update.message.text
+    localization = L(context.user_data.get("language", config.DEFAULT_LANGUAGE))
     
     # Ask about education
     await update.message.reply_text(
         localization.get_text('ask_education')
     )
     
-    return 'EDUCATION'
+    return ConvState.EDUCATION
 
 async def education_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle education collection
@@ -277,26 +398,20 @@ async def education_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     # Store user's education
     education = update.message.text
     context.user_data["education"] = education
+    localization = L(context.user_data.get("language", config.DEFAULT_LANGUAGE))
     
     # Ask about their condition
-    conditions_keyboard = [
-        [InlineKeyboardButton(localization.get_text('depression'), callback_data="depression")],
-        [InlineKeyboardButton(localization.get_text('bipolar'), callback_data="bipolar")],
-        [InlineKeyboardButton(localization.get_text('ocd'), callback_data="ocd")],
-        [InlineKeyboardButton(localization.get_text('unknown'), callback_data="unknown")]
-    ]
-    
     await update.message.reply_text(
         localization.get_text('ask_condition'),
-        reply_markup=InlineKeyboardMarkup(conditions_keyboard)
+        reply_markup=CONDITIONS_KB[localization.language]
     )
     
-    return 'CONDITION'
+    return ConvState.CONDITION
 
 async def condition_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle condition selection
@@ -306,69 +421,129 @@ async def condition_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     user = update.effective_user
     db = context.bot_data['db']
+    lang = context.user_data.get("language", config.DEFAULT_LANGUAGE)
+    localization = L(lang)
     
     # Get condition from callback data or text message
-    condition = update.callback_query.data if update.callback_query else update.message.text.lower()
-    
-    # Check if user already exists in database
-    existing_patient = db.patients.find_one({"telegram_id": user.id})
-    
-    if existing_patient:
-        # Update existing patient record
-        db.patients.update_one(
-            {"telegram_id": user.id},
-            {"$set": {
-                "name": context.user_data["name"],
-                "nationality": context.user_data.get("nationality"),
-                "age": context.user_data.get("age"),
-                "education": context.user_data.get("education"),
-                "condition": condition,
-                "language": context.user_data.get("language", config.DEFAULT_LANGUAGE)
-            }}
-        )
-        patient_id = existing_patient["_id"]
-        logger.info(f"Updated existing patient record for user {user.id}")
+    if update.callback_query:
+        await update.callback_query.answer()
+        condition = update.callback_query.data
     else:
-        # Create new patient record
-        patient = Patient(
-            telegram_id=user.id,
-            name=context.user_data["name"],
-            nationality=context.user_data.get("nationality"),
-            age=context.user_data.get("age"),
-            education=context.user_data.get("education"),
-            condition=condition,
-            language=context.user_data.get("language", config.DEFAULT_LANGUAGE),
-            registration_date=datetime.datetime.now()
-        )
-        
-        # Save to database
-        patient_id = db.patients.insert_one(patient.to_dict()).inserted_id
-        logger.info(f"Created new patient record for user {user.id}")
+        condition = update.message.text.strip().lower()
+        if condition not in config.SUPPORTED_CONDITIONS_SET:
+            condition = "unknown"
+    
+    # Create or update the patient record in a single round trip
+    now = datetime.datetime.now()
+    patient = await _persist_patient(db, user, context, condition, lang, now)
+    patient_id = patient["_id"]
+    logger.info("Saved patient record for user {}", user.id)
     
     # Create initial session
     session = {
         "patient_id": patient_id,
-        "start_time": datetime.datetime.now(),
+        "user_id": user.id,
+        "language": lang,
+        "start_time": now,
         "interactions": []
     }
     context.user_data["session"] = session
     
     # Send welcome message with progress tracking button
-    message = localization.get_text('registration_complete', condition=condition)
+    message = localization.get_text('registration_complete', condition=localization.get_text(condition))
     
     # Add progress tracking button
-    keyboard = letting_go.get_progress_keyboard(str(patient_id))
+    keyboard = _progress_keyboard(lang, _patient_id_hex(context, patient))
     
     if update.callback_query:
         await update.callback_query.edit_message_text(message, reply_markup=keyboard)
     else:
         await update.message.reply_text(message, reply_markup=keyboard)
     
-    return 'CONVERSATION'
+    return ConvState.CONVERSATION
+
+def _is_trivial_message(text):
+    """Check whether a message is a short acknowledgement
+    
+    Args:
+        text (str): The message text
+        
+    Returns:
+        bool: True if emotion analysis can be skipped
+    """
+    normalized = text.strip().lower().rstrip('.!')
+    return len(normalized) < 4 or normalized in _TRIVIAL_MESSAGES
+
+def _patient_id_hex(context, patient):
+    """Get the patient ID as sent in callback data, formatted once per user
+    
+    Args:
+        context: The context object from Telegram
+        patient (dict): The patient document
+        
+    Returns:
+        str: Hex string of the patient's ObjectId
+    """
+    patient_id_hex = context.user_data.get("patient_id_hex")
+    if patient_id_hex is None:
+        patient_id_hex = context.user_data["patient_id_hex"] = str(patient["_id"])
+    return patient_id_hex
+
+async def _get_patient_language(context, user):
+    """Get a user's patient profile and the language to reply in
+    
+    Registered users get their stored language. Users still registering get
+    the language they picked, and everyone else the default language.
+    
+    Args:
+        context: The context object from Telegram
+        user: The Telegram user
+        
+    Returns:
+        tuple: The patient document (or None) and the language code
+    """
+    patient = await context.bot_data['db'].get_profile(user.id)
+    if patient and 'language' in patient:
+        return patient, patient['language']
+    return patient, context.user_data.get("language", config.DEFAULT_LANGUAGE)
+
+async def _persist_patient(db, user, context, condition, lang, now):
+    """Create or update a patient from the registration answers
+    
+    Args:
+        db: Patient store from bot_data
+        user: The Telegram user being registered
+        context: The context object from Telegram, holding the answers
+        condition (str): Selected condition
+        lang (str): Selected language code
+        now (datetime.datetime): Registration time
+        
+    Returns:
+        dict: The stored patient document
+    """
+    patient = Patient(
+        telegram_id=user.id,
+        name=context.user_data["name"],
+        nationality=context.user_data.get("nationality"),
+        age=context.user_data.get("age"),
+        education=context.user_data.get("education"),
+        condition=condition,
+        language=lang,
+        registration_date=now
+    ).to_dict()
+    
+    # Registration answers are always written; the registration date and
+    # metadata only when the patient is new
+    patient.pop("telegram_id")
+    on_insert = {
+        "registration_date": patient.pop("registration_date"),
+        "metadata": patient.pop("metadata")
+    }
+    return await db.update_profile(user.id, patient, on_insert=on_insert)
 
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle user messages during conversation
@@ -378,26 +553,45 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     user = update.effective_user
     db = context.bot_data['db']
     message_text = update.message.text
+    log.debug(
+        "Message from user {} in session {} ({} chars)",
+        lambda: user.id,
+        lambda: context.user_data.get("session", {}).get("session_id"),
+        lambda: len(message_text)
+    )
     
     # Check for session end triggers
-    end_triggers = ['that\'s it', 'بس كده', 'انتهيت', 'finished']
-    if any(trigger in message_text.lower() for trigger in end_triggers):
+    if _END_RE.search(message_text):
         return await generate_report_handler(update, context)
     
+    # The Gemini SDK calls below block, so run them on the AI thread pool
+    loop = asyncio.get_running_loop()
+    executor = context.bot_data.get('executor')
+    
+    # Start analyzing emotions in the message right away: it only needs the text,
+    # so it overlaps the patient lookup and the typing indicator. Short
+    # acknowledgements carry no emotional content worth a model call
+    if _is_trivial_message(message_text):
+        emotion_future = None
+    else:
+        emotion_future = loop.run_in_executor(executor, get_emotion_analyzer().analyze, message_text)
+    
     # Get patient data
-    patient = db.patients.find_one({"telegram_id": user.id})
+    patient = await db.get_profile(user.id)
     if not patient:
+        if emotion_future is not None:
+            emotion_future.cancel()
         await update.message.reply_text("I couldn't find your records. Let's start over.")
         return await start_handler(update, context)
     
     # Set language preference
     lang = patient.get('language', config.DEFAULT_LANGUAGE)
-    localization.switch_language(lang)
+    localization = L(lang)
     
     # Initialize session manager if not already done
     if "session_manager" not in context.bot_data:
@@ -406,97 +600,86 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Show typing indicator
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
     
-    # Analyze emotions in the message
-    emotion_analysis = emotion_analyzer.analyze(message_text)
+    # The reply is conditioned on the emotion analysis, so wait for it here
+    emotion_analysis = await emotion_future if emotion_future is not None else {}
+    
+    # Use the letting go technique when the message carries a strong emotion
+    use_letting_go = emotion_analysis.get("emotion_intensity") in _LETTING_GO_INTENSITIES
+    technique = 'letting_go' if use_letting_go else 'standard'
     
     # Get conversation history from session if available
     conversation_history = context.user_data["session"].get("conversation_history", [])
     
     # Get AI therapist response with appropriate language and technique
-    response = ai_therapist.generate_response(
-        message_text, 
-        emotion_analysis, 
-        patient["condition"],
-        language=lang,
-        conversation_history=conversation_history
+    response = await loop.run_in_executor(
+        executor,
+        functools.partial(
+            get_ai_therapist().generate_response,
+            message_text,
+            emotion_analysis,
+            patient["condition"],
+            language=lang,
+            use_letting_go=use_letting_go,
+            conversation_history=conversation_history,
+            interaction_count=context.user_data["session"].get("interaction_count", 0)
+        )
     )
     
+    # Ensure session has session_id
+    if "session_id" not in context.user_data["session"]:
+        context.user_data["session"]["session_id"] = new_session_id()
+    
     # Record interaction with metadata about technique used
     metadata = {
-        'technique': 'letting_go' if use_letting_go else 'standard',
+        'technique': technique,
         'language': lang,
-        'user_id': user.id
+        'user_id': user.id,
+        'session_id': context.user_data["session"]["session_id"]
     }
     
-    # Add session_id if it exists
-    if "session_id" in context.user_data["session"]:
-        metadata['session_id'] = context.user_data["session"]["session_id"]
+    # Count the technique used in the session metadata
+    technique_counts = context.user_data["session"].setdefault("metadata", {}).setdefault("technique_counts", {})
+    technique_counts[technique] = technique_counts.get(technique, 0) + 1
     
-    # Add technique used to session metadata
-    if "metadata" not in context.user_data["session"]:
-        context.user_data["session"]["metadata"] = {"techniques_used": []}
-    if "techniques_used" not in context.user_data["session"]["metadata"]:
-        context.user_data["session"]["metadata"]["techniques_used"] = []
-    context.user_data["session"]["metadata"]["techniques_used"].append('letting_go' if use_letting_go else 'standard')
+    # Create progress tracking button
+    keyboard = _progress_keyboard(lang, _patient_id_hex(context, patient))
     
-    # Ensure session has session_id
-    if "session_id" not in context.user_data["session"]:
-        context.user_data["session"]["session_id"] = str(datetime.now().timestamp())
-        
-    # Use session manager to add interaction
-    context.user_data["session"] = context.bot_data["session_manager"].add_interaction(
+    # Send response to user with progress tracking button before storing it,
+    # so the reply does not wait on the MongoDB write
+    await update.message.reply_text(response, reply_markup=keyboard)
+    
+    # Use session manager to add and store the interaction. This is still
+    # awaited so the chat's next message sees the updated history
+    context.user_data["session"] = await asyncio.to_thread(
+        context.bot_data["session_manager"].add_interaction,
         context.user_data["session"],
         message_text,
         response,
-        emotion_analysis
+        emotion_analysis,
+        metadata
     )
     
-    # Save session to database periodically
-    if len(context.user_data["session"]["interactions"]) % 5 == 0:
-        # Create Session object with enhanced fields
-        session = Session(
-            patient_id=context.user_data["session"]["patient_id"],
-            start_time=context.user_data["session"]["start_time"],
-            session_id=context.user_data["session"]["session_id"],
-            user_id=user.id,
-            end_time=datetime.datetime.now(),
-            interactions=context.user_data["session"]["interactions"],
-            language=lang,
-            condition_classification=context.user_data["session"].get("metadata", {}).get("condition_classifications", [])[-1] if context.user_data["session"].get("metadata", {}).get("condition_classifications", []) else None
-        )
-        db.sessions.insert_one(session.to_dict())
-    
-    # Create progress tracking button
-    keyboard = letting_go.get_progress_keyboard(str(patient["_id"]))
-    
-    # Send response to user with progress tracking button
-    await update.message.reply_text(response, reply_markup=keyboard)
-    
     # If using letting go technique and not already in a letting go flow, offer to try it
     if use_letting_go and not context.user_data.get("letting_go_active"):
         # Only suggest letting go technique occasionally to avoid being repetitive
-        if len(context.user_data["session"]["interactions"]) % 3 == 0:
+        if context.user_data["session"].get("interaction_count", 0) % 3 == 0:
             context.user_data["letting_go_active"] = True
             await update.message.reply_text(
                 localization.get_text('letting_go_prompt'),
-                reply_markup=letting_go.get_prompt_keyboard()
+                reply_markup=LETTING_GO[lang].get_prompt_keyboard()
             )
     
-    return 'CONVERSATION'
+    return ConvState.CONVERSATION
 
 async def generate_report_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Generate and send a session report to the user"""
     user = update.effective_user
-    db = context.bot_data['db']
     
     # Get language preference
-    lang = config.DEFAULT_LANGUAGE
-    patient = db.patients.find_one({"telegram_id": user.id})
-    if patient and 'language' in patient:
-        lang = patient['language']
+    patient, lang = await _get_patient_language(context, user)
     
-    # Update localization
-    localization.switch_language(lang)
+    # Get localization for the user's language
+    localization = L(lang)
     
     # Generate report
     report = ReportGenerator.generate_session_report(
@@ -524,16 +707,12 @@ async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         context: The context object from Telegram
     """
     user = update.effective_user
-    db = context.bot_data['db']
     
     # Get language preference
-    lang = config.DEFAULT_LANGUAGE
-    patient = db.patients.find_one({"telegram_id": user.id})
-    if patient and 'language' in patient:
-        lang = patient['language']
+    patient, lang = await _get_patient_language(context, user)
     
-    # Update localization
-    localization.switch_language(lang)
+    # Get localization for the user's language
+    localization = L(lang)
     
     # Get localized help text
     help_text = localization.get_text('help_text')
@@ -554,13 +733,10 @@ async def end_conversation_handler(update: Update, context: ContextTypes.DEFAULT
     db = context.bot_data['db']
     
     # Get language preference
-    lang = config.DEFAULT_LANGUAGE
-    patient = db.patients.find_one({"telegram_id": user.id})
-    if patient and 'language' in patient:
-        lang = patient['language']
+    patient, lang = await _get_patient_language(context, user)
     
-    # Update localization
-    localization.switch_language(lang)
+    # Get localization for the user's language
+    localization = L(lang)
     
     # Initialize session manager if not already done
     if "session_manager" not in context.bot_data:
@@ -568,13 +744,22 @@ async def end_conversation_handler(update: Update, context: ContextTypes.DEFAULT
     
     # Save the current session to database and generate summary
     if "session" in context.user_data:
-        # Use session manager to end the session
-        session_id = context.bot_data["session_manager"].end_session(context.user_data["session"])
+        # End the session before offering its report, so the stored document
+        # and summary exist when the report button is pressed. The user's last
+        # message has already been answered, so only the goodbye waits
+        session = context.user_data["session"]
+        session_id = session.get("session_id")
+        if session_id is None:
+            session_id = session["session_id"] = new_session_id()
+        try:
+            await asyncio.to_thread(context.bot_data["session_manager"].end_session, session)
+        except Exception as e:
+            logger.opt(exception=e).error("Ending session {} failed", session_id)
         
         # Generate a brief end-of-session report
         keyboard = [
             [InlineKeyboardButton(localization.get_text('get_report'), callback_data=f"report_{session_id}")],
-            [InlineKeyboardButton(localization.get_text('view_progress'), callback_data=f"progress_{patient['_id']}")]
+            [InlineKeyboardButton(localization.get_text('view_progress'), callback_data=f"progress_{_patient_id_hex(context, patient)}")]
         ]
         
         # Send end message with options to view report or progress
@@ -591,14 +776,19 @@ async def end_conversation_handler(update: Update, context: ContextTypes.DEFAULT
     return ConversationHandler.END
 
 async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle callback queries from inline keyboards
+    """Handle callback queries from the menu and report inline keyboards
+    
+    Language and condition buttons are routed to language_handler and
+    condition_handler by their callback data pattern. Every other button is
+    looked up in CALLBACK_ROUTES by its callback data, then in PREFIX_ROUTES
+    by its prefix.
     
     Args:
         update: The update object from Telegram
         context: The context object from Telegram
         
     Returns:
-        int: The next conversation state
+        ConvState: The next conversation state
     """
     query = update.callback_query
     await query.answer()
@@ -608,380 +798,423 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
     user = update.effective_user
     db = context.bot_data['db']
     
-    # Handle language selection
-    if data.startswith("lang_"):
-        return await language_handler(update, context)
-    
-    # Handle letting go technique responses
-    if data == "letting_go_yes":
-        # User wants to try the letting go technique
-        patient = db.patients.find_one({"telegram_id": user.id})
-        lang = patient.get('language', config.DEFAULT_LANGUAGE)
-        localization.switch_language(lang)
-        
-        # Send the letting go steps
-        await query.edit_message_text(letting_go.get_introduction())
-        
-        # Send the first step
-        keyboard = letting_go.get_progress_keyboard(str(patient["_id"]))
-        await update.effective_chat.send_message(
-            letting_go.get_step_prompt(1),
-            reply_markup=keyboard
-        )
+    # Handle the button through its route
+    handler = CALLBACK_ROUTES.get(data)
+    if handler is None:
+        handler = next((route for prefix, route in PREFIX_ROUTES if data.startswith(prefix)), None)
+    if handler is None:
+        return None
+    return await handler(update, context, query, user, db)
+
+async def _letting_go_yes_callback(update, context, query, user, db):
+    """Start the letting go technique after the user accepts it
+    
+    Args:
+        update: The update object from Telegram
+        context: The context object from Telegram
+        query: The answered callback query
+        user: The user who pressed the button
+        db: Patient store from bot_data
         
-        return 'CONVERSATION'
+    Returns:
+        ConvState: The next conversation state
+    """
+    # User wants to try the letting go technique
+    patient = await db.get_profile(user.id)
+    lang = patient.get('language', config.DEFAULT_LANGUAGE)
+    localization = L(lang)
+    
+    # Show the introduction and the first step in one message
+    keyboard = _progress_keyboard(lang, _patient_id_hex(context, patient))
+    await query.edit_message_text(
+        f"{LETTING_GO[lang].get_introduction()}\n\n{LETTING_GO[lang].get_step_prompt(1)}",
+        reply_markup=keyboard
+    )
+    
+    return ConvState.CONVERSATION
+
+async def _letting_go_no_callback(update, context, query, user, db):
+    """Continue the conversation after the user declines the letting go technique
     
-    elif data == "letting_go_no":
-        # User doesn't want to try the letting go technique
-        patient = db.patients.find_one({"telegram_id": user.id})
-        lang = patient.get('language', config.DEFAULT_LANGUAGE)
-        localization.switch_language(lang)
+    Args:
+        update: The update object from Telegram
+        context: The context object from Telegram
+        query: The answered callback query
+        user: The user who pressed the button
+        db: Patient store from bot_data
         
-        # Reset the letting go active flag
-        context.user_data["letting_go_active"] = False
+    Returns:
+        ConvState: The next conversation state
+    """
+    # User doesn't want to try the letting go technique
+    patient = await db.get_profile(user.id)
+    lang = patient.get('language', config.DEFAULT_LANGUAGE)
+    localization = L(lang)
+    
+    # Reset the letting go active flag
+    context.user_data["letting_go_active"] = False
+    
+    # Send acknowledgment
+    keyboard = _progress_keyboard(lang, _patient_id_hex(context, patient))
+    await query.edit_message_text(
+        localization.get_text('how_feeling_today', name=patient['name']),
+        reply_markup=keyboard
+    )
+    
+    return ConvState.CONVERSATION
+
+async def _progress_callback(update, context, query, user, db):
+    """Show letting go progress for the current session
+    
+    Args:
+        update: The update object from Telegram
+        context: The context object from Telegram
+        query: The answered callback query
+        user: The user who pressed the button
+        db: Patient store from bot_data
         
-        # Send acknowledgment
-        keyboard = letting_go.get_progress_keyboard(str(patient["_id"]))
-        await query.edit_message_text(
-            localization.get_text('how_feeling_today', name=patient['name']),
-            reply_markup=keyboard
+    Returns:
+        ConvState: The next conversation state
+    """
+    # Extract session ID from callback data
+    session_id = query.data.split("_")[1]
+    
+    patient = await db.get_profile(user.id)
+    if not patient:
+        await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
+        return ConversationHandler.END
+    
+    # Set language preference
+    lang = patient.get('language', config.DEFAULT_LANGUAGE)
+    localization = L(lang)
+    
+    # Initialize session manager if not already done
+    if "session_manager" not in context.bot_data:
+        context.bot_data["session_manager"] = SessionManager(db, lang)
+    
+    # Set greeting flag to ensure welcome message only appears once
+    context.user_data["greeted"] = True
+    
+    # Get current session data
+    session_data = context.user_data.get("session", {})
+    
+    # Calculate progress metrics
+    metrics = LETTING_GO[lang].track_progress(patient, session_data)
+    
+    # Generate progress message
+    parts = [f"*{localization.get_text('progress_report_title')}*\n\n"]
+    
+    # Add progress percentage
+    progress_percentage = metrics.get('progress_percentage', 0)
+    progress_bar = PROGRESS_BARS[progress_percentage // 10]
+    parts.append(f"{progress_bar} {progress_percentage}%\n\n")
+    
+    # Add technique usage
+    technique_count = metrics.get('technique_used_count', 0)
+    parts.append(f"Letting Go technique used: {technique_count} times\n\n")
+    
+    # Add emotional trend if available, counted in a single pass
+    emotion_counts = Counter(
+        interaction["emotion_analysis"]["primary_emotion"]
+        for interaction in session_data.get('interactions', [])
+        if isinstance(interaction.get("emotion_analysis"), dict)
+        and "primary_emotion" in interaction["emotion_analysis"]
+    )
+    
+    if emotion_counts:
+        parts.append(f"{localization.get_text('emotional_trends')}\n")
+        parts.extend(
+            f"- {emotion.capitalize()}: {count} times\n"
+            for emotion, count in emotion_counts.most_common()
         )
-        
-        return 'CONVERSATION'
+    progress_message = "".join(parts)
     
-    # Handle progress tracking
-    elif data.startswith("progress_"):
-        # Extract session ID from callback data
-        session_id = data.split("_")[1]
-        
-        patient = db.patients.find_one({"telegram_id": user.id})
-        if not patient:
-            await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
-            return ConversationHandler.END
-        
-        # Set language preference
-        lang = patient.get('language', config.DEFAULT_LANGUAGE)
-        localization.switch_language(lang)
-        
-        # Initialize session manager if not already done
-        if "session_manager" not in context.bot_data:
-            context.bot_data["session_manager"] = SessionManager(db, lang)
-            
-        # Set greeting flag to ensure welcome message only appears once
-        context.user_data["greeted"] = True
-        
-        # Get current session data
-        session_data = context.user_data.get("session", {})
-        
-        # Calculate progress metrics
-        metrics = letting_go.track_progress(patient, session_data)
-        
-        # Generate progress message
-        progress_message = f"*{localization.get_text('progress_report_title')}*\n\n"
-        
-        # Add progress percentage
-        progress_percentage = metrics.get('progress_percentage', 0)
-        progress_bar = "" + "█" * (progress_percentage // 10) + "░" * (10 - progress_percentage // 10)
-        progress_message += f"{progress_bar} {progress_percentage}%\n\n"
-        
-        # Add technique usage
-        technique_count = metrics.get('technique_used_count', 0)
-        progress_message += f"Letting Go technique used: {technique_count} times\n\n"
-        
-        # Add emotional trend if available
-        recent_emotions = []
-        for interaction in session_data.get('interactions', []):
-            if "emotion_analysis" in interaction:
-                emotion_analysis = interaction["emotion_analysis"]
-                if isinstance(emotion_analysis, dict) and "primary_emotion" in emotion_analysis:
-                    recent_emotions.append(emotion_analysis["primary_emotion"])
-        
-        if recent_emotions:
-            progress_message += f"{localization.get_text('emotional_trends')}\n"
-            for emotion in set(recent_emotions):
-                count = recent_emotions.count(emotion)
-                progress_message += f"- {emotion.capitalize()}: {count} times\n"
+    # Add buttons to continue
+    await query.edit_message_text(
+        progress_message,
+        reply_markup=CONTINUE_KB[localization.language],
+        parse_mode="Markdown"
+    )
+    
+    return ConvState.CONVERSATION
+
+async def _session_report_callback(update, context, query, user, db):
+    """Show the report of a finished session
+    
+    Args:
+        update: The update object from Telegram
+        context: The context object from Telegram
+        query: The answered callback query
+        user: The user who pressed the button
+        db: Patient store from bot_data
         
-        # Add buttons to continue
-        keyboard = [
-            [InlineKeyboardButton(localization.get_text('continue_conversation'), callback_data="continue_conversation")]
-        ]
+    Returns:
+        ConvState: The next conversation state
+    """
+    # Extract session ID from callback data
+    session_id = query.data.split("_")[1]
+    
+    patient = await db.get_profile(user.id)
+    if not patient:
+        await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
+        return ConversationHandler.END
+    
+    # Set language preference
+    lang = patient.get('language', config.DEFAULT_LANGUAGE)
+    localization = L(lang)
+    
+    # Initialize session manager if not already done
+    if "session_manager" not in context.bot_data:
+        context.bot_data["session_manager"] = SessionManager(db, lang)
+    
+    # Set greeting flag to ensure welcome message only appears once
+    context.user_data["greeted"] = True
+    
+    # Get the session from database by the session_id sent in the callback
+    # data, fetching only the fields the report shows. The patient filter
+    # keeps users to their own sessions
+    session = await asyncio.to_thread(
+        db.sessions.find_one,
+        {"session_id": session_id, "patient_id": patient["_id"]},
+        SESSION_REPORT_PROJECTION
+    )
+    if not session:
+        await query.edit_message_text(localization.get_text('report_error'))
+        return ConvState.CONVERSATION
+    
+    # Add session information
+    now = datetime.datetime.now()
+    session_date = session.get("end_time", now).strftime("%Y-%m-%d")
+    session_duration = str(session.get("end_time", now) - session.get("start_time", now))
+    interaction_count = len(session.get("interactions", []))
+    
+    # Generate report message
+    headings = REPORT_HEADINGS[localization.language]
+    parts = [
+        headings['therapeutic_report_title'], "\n",
+        f"{localization.get_text('session_date')}: {session_date}\n",
+        f"{localization.get_text('session_duration')}: {session_duration}\n",
+        f"{localization.get_text('interaction_count')}: {interaction_count}\n\n"
+    ]
+    
+    # Add summary
+    if "summary" in session and session["summary"]:
+        parts.extend((headings['summary'], f"{session['summary']}\n\n"))
+    
+    # Add condition classification if available
+    if "condition_classification" in session and session["condition_classification"]:
+        parts.extend((headings['condition'], f"{session['condition_classification'].capitalize()}\n\n"))
+    
+    # Add emotional trends, counted in a single pass
+    emotion_counts = Counter(
+        interaction["emotion_analysis"]["primary_emotion"]
+        for interaction in session.get("interactions", [])
+        if "emotion_analysis" in interaction and "primary_emotion" in interaction["emotion_analysis"]
+    )
+    
+    if emotion_counts:
+        # Format the top three trends
+        parts.append(headings['emotional_trends'])
+        parts.extend(f"- {emotion.capitalize()}: {count} times\n" for emotion, count in emotion_counts.most_common(3))
+        parts.append("\n")
+    
+    # Add recommendations if available
+    if "metrics" in session and "recommendations" in session["metrics"]:
+        parts.append(headings['recommendations'])
+        parts.extend(f"- {recommendation}\n" for recommendation in session["metrics"]["recommendations"][:2])  # Show top 2 recommendations
+    report_message = "".join(parts)
+    
+    # Add buttons to start a new conversation
+    await query.edit_message_text(
+        report_message,
+        reply_markup=CONTINUE_KB[localization.language],
+        parse_mode="Markdown"
+    )
+    
+    return ConvState.CONVERSATION
+
+async def _view_progress_callback(update, context, query, user, db):
+    """Show the patient's progress across recent sessions
+    
+    Args:
+        update: The update object from Telegram
+        context: The context object from Telegram
+        query: The answered callback query
+        user: The user who pressed the button
+        db: Patient store from bot_data
         
-        await query.edit_message_text(
-            progress_message,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode="Markdown"
+    Returns:
+        ConvState: The next conversation state
+    """
+    # Handle view progress button
+    patient = await db.get_profile(user.id)
+    if not patient:
+        await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
+        return ConversationHandler.END
+    
+    # Get the session count and the recent sessions in one round trip. The
+    # server counts each session's interactions and returns only the list of
+    # their dominant emotions
+    pipeline = [
+        {"$match": {"patient_id": patient["_id"]}},
+        {"$facet": {
+            "recent": [
+                {"$sort": {"start_time": -1}},
+                {"$limit": 5},
+                {"$project": {
+                    "_id": 0,
+                    "interaction_count": {"$size": {"$ifNull": ["$interactions", []]}},
+                    "emotions": "$interactions.emotion_analysis.dominant_emotion"
+                }}
+            ],
+            "total": [{"$count": "n"}]
+        }}
+    ]
+    results = await asyncio.to_thread(lambda: list(db.sessions.aggregate(pipeline)))
+    stats = results[0] if results else {}
+    recent_sessions = stats.get("recent", [])
+    
+    # Calculate progress metrics
+    total_sessions = stats["total"][0]["n"] if stats.get("total") else 0
+    total_interactions = 0
+    emotion_counts = Counter()
+    
+    # Add up interactions and dominant emotions in a single pass over the sessions
+    for session in recent_sessions:
+        total_interactions += session["interaction_count"]
+        emotion_counts.update(session.get("emotions") or [])
+    
+    # Generate progress message
+    parts = [
+        "📊 *Your Progress Report*\n\n",
+        f"Total Sessions: {total_sessions}\n",
+        f"Recent Interactions: {total_interactions}\n\n"
+    ]
+    
+    # Add emotional trend if available
+    if emotion_counts:
+        parts.append("Recent Emotional Trends:\n")
+        parts.extend(
+            f"- {emotion.capitalize()}: {count} times\n"
+            for emotion, count in emotion_counts.most_common()
         )
+    
+    # Add engagement info
+    parts.append(f"\nYou've been using AMIRA since {patient['registration_date'].strftime('%B %d, %Y')}\n")
+    progress_message = "".join(parts)
+    
+    # Add buttons for more options
+    await query.edit_message_text(
+        progress_message,
+        reply_markup=VIEW_PROGRESS_KB,
+        parse_mode="Markdown"
+    )
+    
+    return ConvState.CONVERSATION
+
+async def _get_report_callback(update, context, query, user, db):
+    """Generate and show a progress report
+    
+    Args:
+        update: The update object from Telegram
+        context: The context object from Telegram
+        query: The answered callback query
+        user: The user who pressed the button
+        db: Patient store from bot_data
         
-        return 'CONVERSATION'
+    Returns:
+        ConvState: The next conversation state
+    """
+    # Handle get report button
+    patient = await db.get_profile(user.id)
+    if not patient:
+        await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
+        return ConversationHandler.END
+    
+    await query.edit_message_text("Generating your therapeutic report... This may take a moment.")
+    
+    # Initialize report generator if not already done
+    if "report_generator" not in context.bot_data:
+        context.bot_data["report_generator"] = ReportGenerator(db)
+    report_generator = context.bot_data["report_generator"]
+    
+    # Generate progress report on the AI thread pool; it blocks on MongoDB and Gemini
+    report = await asyncio.get_running_loop().run_in_executor(
+        context.bot_data.get('executor'),
+        report_generator.generate_progress_report,
+        patient["_id"]
+    )
+    
+    if report:
+        # Format report for Telegram message
+        report_content = report.get("content", {})
         
-    elif data.startswith("report_"):
-        # Extract session ID from callback data
-        session_id = data.split("_")[1]
+        parts = ["📝 *Your Therapeutic Report*\n\n"]
         
-        patient = db.patients.find_one({"telegram_id": user.id})
-        if not patient:
-            await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
-            return ConversationHandler.END
+        # Add overall assessment
+        if "overall_assessment" in report_content:
+            parts.append(f"*Overall Assessment:*\n{report_content['overall_assessment']}\n\n")
         
-        # Set language preference
-        lang = patient.get('language', config.DEFAULT_LANGUAGE)
-        localization.switch_language(lang)
+        # Add progress indicators
+        if "progress_indicators" in report_content and report_content["progress_indicators"]:
+            parts.append("*Progress Indicators:*\n")
+            parts.extend(f"- {indicator}\n" for indicator in report_content["progress_indicators"])
+            parts.append("\n")
         
-        # Initialize session manager if not already done
-        if "session_manager" not in context.bot_data:
-            context.bot_data["session_manager"] = SessionManager(db, lang)
-            
-        # Set greeting flag to ensure welcome message only appears once
-        context.user_data["greeted"] = True
+        # Add recommendations
+        if "recommendations" in report_content and report_content["recommendations"]:
+            parts.append("*Recommendations:*\n")
+            parts.extend(f"- {recommendation}\n" for recommendation in report_content["recommendations"])
         
-        # Get the session from database
-        session = db.sessions.find_one({"_id": ObjectId(session_id)})
-        if not session:
-            await query.edit_message_text(localization.get_text('report_error'))
-            return 'CONVERSATION'
-        
-        # Generate report message
-        report_message = f"*{localization.get_text('therapeutic_report_title')}*\n\n"
-        
-        # Add session information
-        session_date = session.get("end_time", datetime.datetime.now()).strftime("%Y-%m-%d")
-        session_duration = str(session.get("end_time", datetime.datetime.now()) - session.get("start_time", datetime.datetime.now()))
-        interaction_count = len(session.get("interactions", []))
-        
-        report_message += f"{localization.get_text('session_date')}: {session_date}\n"
-        report_message += f"{localization.get_text('session_duration')}: {session_duration}\n"
-        report_message += f"{localization.get_text('interaction_count')}: {interaction_count}\n\n"
-        
-        # Add summary
-        if "summary" in session and session["summary"]:
-            report_message += f"*{localization.get_text('summary')}*\n{session['summary']}\n\n"
-        
-        # Add condition classification if available
-        if "condition_classification" in session and session["condition_classification"]:
-            report_message += f"*{localization.get_text('condition')}*\n{session['condition_classification'].capitalize()}\n\n"
-        
-        # Add emotional trends
-        emotional_states = []
-        for interaction in session.get("interactions", []):
-            if "emotion_analysis" in interaction and "primary_emotion" in interaction["emotion_analysis"]:
-                emotional_states.append(interaction["emotion_analysis"]["primary_emotion"])
-        
-        if emotional_states:
-            # Count emotion frequencies
-            emotion_counts = {}
-            for emotion in emotional_states:
-                if emotion in emotion_counts:
-                    emotion_counts[emotion] += 1
-                else:
-                    emotion_counts[emotion] = 1
-            
-            # Format trends
-            report_message += f"*{localization.get_text('emotional_trends')}*\n"
-            for emotion, count in sorted(emotion_counts.items(), key=lambda x: x[1], reverse=True)[:3]:
-                report_message += f"- {emotion.capitalize()}: {count} times\n"
-            report_message += "\n"
-        
-        # Add recommendations if available
-        if "metrics" in session and "recommendations" in session["metrics"]:
-            report_message += f"*{localization.get_text('recommendations')}*\n"
-            for recommendation in session["metrics"]["recommendations"][:2]:  # Show top 2 recommendations
-                report_message += f"- {recommendation}\n"
-        
-        # Add buttons to start a new conversation
-        keyboard = [
-            [InlineKeyboardButton(localization.get_text('continue_conversation'), callback_data="continue_conversation")]
-        ]
+        report_message = "".join(parts)
         
+        # Add button to continue conversation
         await query.edit_message_text(
             report_message,
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_markup=REPORT_KB,
             parse_mode="Markdown"
         )
-        
-        return 'CONVERSATION'
-    
-    elif data in config.SUPPORTED_CONDITIONS or data == "unknown":
-        # Handle condition selection
-        # Check if user already exists in database
-        existing_patient = db.patients.find_one({"telegram_id": user.id})
-        
-        if existing_patient:
-            # Update existing patient record
-            db.patients.update_one(
-                {"telegram_id": user.id},
-                {"$set": {
-                    "name": context.user_data["name"],
-                    "nationality": context.user_data.get("nationality"),
-                    "age": context.user_data.get("age"),
-                    "education": context.user_data.get("education"),
-                    "condition": data,
-                    "language": context.user_data.get("language", config.DEFAULT_LANGUAGE)
-                }}
-            )
-            patient_id = existing_patient["_id"]
-            logger.info(f"Updated existing patient record for user {user.id} via callback")
-        else:
-            # Create new patient record
-            patient = Patient(
-                telegram_id=user.id,
-                name=context.user_data["name"],
-                nationality=context.user_data.get("nationality"),
-                age=context.user_data.get("age"),
-                education=context.user_data.get("education"),
-                condition=data,
-                language=context.user_data.get("language", config.DEFAULT_LANGUAGE),
-                registration_date=datetime.datetime.now()
-            )
-            
-            # Save to database
-            patient_id = db.patients.insert_one(patient.to_dict()).inserted_id
-            logger.info(f"Created new patient record for user {user.id} via callback")
-        
-        # Create initial session
-        session = {
-            "patient_id": patient_id,
-            "start_time": datetime.datetime.now(),
-            "interactions": []
-        }
-        context.user_data["session"] = session
-        
-        # Get localized condition name
-        condition_key = data if data != "unknown" else "unknown"
-        condition_name = localization.get_text(condition_key)
-        
-        # Send welcome message with progress tracking button
-        message = localization.get_text('registration_complete', condition=condition_name)
-        
-        # Add progress tracking button
-        keyboard = letting_go.get_progress_keyboard(str(patient_id))
-        
-        await query.edit_message_text(message, reply_markup=keyboard)
-        
-        return 'CONVERSATION'
-    
-    elif data == "view_progress":
-        # Handle view progress button
-        patient = db.patients.find_one({"telegram_id": user.id})
-        if not patient:
-            await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
-            return ConversationHandler.END
-        
-        # Get recent sessions
-        recent_sessions = list(db.sessions.find({"patient_id": patient["_id"]}).sort("start_time", -1).limit(5))
-        
-        # Calculate progress metrics
-        total_sessions = db.sessions.count_documents({"patient_id": patient["_id"]})
-        total_interactions = 0
-        recent_emotions = []
-        
-        for session in recent_sessions:
-            interactions = session.get("interactions", [])
-            total_interactions += len(interactions)
-            for interaction in interactions:
-                if "emotion_analysis" in interaction:
-                    recent_emotions.append(interaction["emotion_analysis"])
-        
-        # Generate progress message
-        progress_message = f"📊 *Your Progress Report*\n\n"
-        progress_message += f"Total Sessions: {total_sessions}\n"
-        progress_message += f"Recent Interactions: {total_interactions}\n\n"
-        
-        # Add emotional trend if available
-        if recent_emotions:
-            # Simplified emotion analysis for display
-            dominant_emotions = []
-            for emotion in recent_emotions:
-                if isinstance(emotion, dict) and "dominant_emotion" in emotion:
-                    dominant_emotions.append(emotion["dominant_emotion"])
-            
-            if dominant_emotions:
-                progress_message += "Recent Emotional Trends:\n"
-                for emotion in set(dominant_emotions):
-                    count = dominant_emotions.count(emotion)
-                    progress_message += f"- {emotion.capitalize()}: {count} times\n"
-        
-        # Add engagement info
-        progress_message += f"\nYou've been using AMIRA since {patient['registration_date'].strftime('%B %d, %Y')}\n"
-        
-        # Add buttons for more options
-        keyboard = [
-            [InlineKeyboardButton("Get Detailed Report", callback_data="get_report")],
-            [InlineKeyboardButton("Continue Conversation", callback_data="continue_conversation")]
-        ]
-        
+    else:
         await query.edit_message_text(
-            progress_message,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode="Markdown"
+            "I'm sorry, I couldn't generate a report at this time. Let's continue our conversation instead.",
+            reply_markup=REPORT_UNAVAILABLE_KB
         )
-        
-        return 'CONVERSATION'
     
-    elif data == "get_report":
-        # Handle get report button
-        patient = db.patients.find_one({"telegram_id": user.id})
-        if not patient:
-            await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
-            return ConversationHandler.END
-        
-        await query.edit_message_text("Generating your therapeutic report... This may take a moment.")
-        
-        # Initialize report generator
-        report_generator = ReportGenerator(db)
-        
-        # Generate progress report
-        report = report_generator.generate_progress_report(patient["_id"])
-        
-        if report:
-            # Format report for Telegram message
-            report_content = report.get("content", {})
-            
-            report_message = f"📝 *Your Therapeutic Report*\n\n"
-            
-            # Add overall assessment
-            if "overall_assessment" in report_content:
-                report_message += f"*Overall Assessment:*\n{report_content['overall_assessment']}\n\n"
-            
-            # Add progress indicators
-            if "progress_indicators" in report_content and report_content["progress_indicators"]:
-                report_message += "*Progress Indicators:*\n"
-                for indicator in report_content["progress_indicators"]:
-                    report_message += f"- {indicator}\n"
-                report_message += "\n"
-            
-            # Add recommendations
-            if "recommendations" in report_content and report_content["recommendations"]:
-                report_message += "*Recommendations:*\n"
-                for recommendation in report_content["recommendations"]:
-                    report_message += f"- {recommendation}\n"
-            
-            # Add button to continue conversation
-            keyboard = [
-                [InlineKeyboardButton("Continue Conversation", callback_data="continue_conversation")]
-            ]
-            
-            await query.edit_message_text(
-                report_message,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode="Markdown"
-            )
-        else:
-            await query.edit_message_text(
-                "I'm sorry, I couldn't generate a report at this time. Let's continue our conversation instead.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Continue", callback_data="continue_conversation")]])
-            )
-        
-        return 'CONVERSATION'
+    return ConvState.CONVERSATION
+
+async def _continue_conversation_callback(update, context, query, user, db):
+    """Return to the conversation
     
-    elif data == "continue_conversation":
-        # Handle continue conversation button
-        patient = db.patients.find_one({"telegram_id": user.id})
-        if not patient:
-            await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
-            return ConversationHandler.END
+    Args:
+        update: The update object from Telegram
+        context: The context object from Telegram
+        query: The answered callback query
+        user: The user who pressed the button
+        db: Patient store from bot_data
         
-        await query.edit_message_text(localization.get_text('how_are_you_feeling', name=patient['name']))
-        return 'CONVERSATION'
+    Returns:
+        ConvState: The next conversation state
+    """
+    # Handle continue conversation button
+    patient = await db.get_profile(user.id)
+    if not patient:
+        await query.edit_message_text("I couldn't find your records. Please start a new conversation with /start.")
+        return ConversationHandler.END
     
-    return None
\ No newline at end of file
+    localization = L(patient.get('language', config.DEFAULT_LANGUAGE))
+    await query.edit_message_text(localization.get_text('how_are_you_feeling', name=patient['name']))
+    return ConvState.CONVERSATION
+
+# Menu and report buttons handled by callback_query_handler: exact callback data
+# first, then callback data prefixes carrying an ID
+CALLBACK_ROUTES = {
+    "letting_go_yes": _letting_go_yes_callback,
+    "letting_go_no": _letting_go_no_callback,
+    "view_progress": _view_progress_callback,
+    "get_report": _get_report_callback,
+    "continue_conversation": _continue_conversation_callback,
+}
+PREFIX_ROUTES = (
+    ("progress_", _progress_callback),
+    ("report_", _session_report_callback),
+)
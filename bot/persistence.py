@@ -0,0 +1,124 @@
+"""Redis persistence for AMIRA
+
+This module stores ConversationHandler states and per-user data in Redis, so
+conversations survive bot restarts and deployments.
+"""
+
+import pickle
+from redis.exceptions import RedisError
+from telegram.ext import BasePersistence, PersistenceInput
+from loguru import logger
+
+class RedisPersistence(BasePersistence):
+    """python-telegram-bot persistence backed by redis.asyncio
+
+    Conversation states are kept in the hash ``amira:conv:<name>`` keyed by
+    ``<chat_id>:<user_id>``, and user data under ``amira:user:<user_id>``.
+    Bot, chat and callback data are not persisted: bot_data holds live objects
+    such as the database connection.
+
+    python-telegram-bot loads persisted data once at startup and keeps it in
+    memory afterwards, so several workers sharing one Redis still need each
+    user's updates routed to the same worker.
+
+    Redis errors are logged rather than raised. The in-memory copy stays the
+    working state, so an outage only costs persistence across restarts: a
+    failed load starts empty and a failed write is retried with the next
+    change.
+    """
+
+    CONVERSATION_PREFIX = 'amira:conv:'
+    USER_PREFIX = 'amira:user:'
+
+    def __init__(self, redis, update_interval=5):
+        """Initialize the RedisPersistence
+
+        Args:
+            redis: redis.asyncio client
+            update_interval (float, optional): Seconds between writes of changed data
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.redis = redis
+        logger.info("Redis persistence initialized")
+
+    async def get_conversations(self, name):
+        try:
+            states = await self.redis.hgetall(f"{self.CONVERSATION_PREFIX}{name}")
+        except RedisError as e:
+            logger.warning("Could not load conversation states from Redis: {}", e)
+            return {}
+        return {
+            tuple(int(part) for part in key.decode().split(':')): pickle.loads(state)
+            for key, state in states.items()
+        }
+
+    async def update_conversation(self, name, key, new_state):
+        field = ':'.join(str(part) for part in key)
+        try:
+            if new_state is None:
+                await self.redis.hdel(f"{self.CONVERSATION_PREFIX}{name}", field)
+            else:
+                await self.redis.hset(f"{self.CONVERSATION_PREFIX}{name}", field, pickle.dumps(new_state))
+        except RedisError as e:
+            logger.warning("Could not save conversation state in Redis: {}", e)
+
+    async def get_user_data(self):
+        user_data = {}
+        try:
+            async for key in self.redis.scan_iter(match=f"{self.USER_PREFIX}*"):
+                data = await self.redis.get(key)
+                if data:
+                    user_id = int(key.decode()[len(self.USER_PREFIX):])
+                    user_data[user_id] = pickle.loads(data)
+        except RedisError as e:
+            logger.warning("Could not load user data from Redis: {}", e)
+            return {}
+        return user_data
+
+    async def update_user_data(self, user_id, data):
+        try:
+            await self.redis.set(f"{self.USER_PREFIX}{user_id}", pickle.dumps(data))
+        except RedisError as e:
+            logger.warning("Could not save user data in Redis: {}", e)
+
+    async def drop_user_data(self, user_id):
+        try:
+            await self.redis.delete(f"{self.USER_PREFIX}{user_id}")
+        except RedisError as e:
+            logger.warning("Could not drop user data from Redis: {}", e)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def flush(self):
+        pass
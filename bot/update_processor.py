@@ -0,0 +1,63 @@
+"""Update processing for AMIRA
+
+This module decides how concurrently dispatched Telegram updates are run:
+updates from different chats are handled in parallel, while updates from the
+same chat are handled one at a time in the order they arrived.
+"""
+
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+from loguru import logger
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Update processor that serializes updates per chat
+
+    python-telegram-bot already pulls updates off its queue and hands them to
+    the processor without waiting for earlier ones to finish. During a burst
+    (many users pressing a button at once) this processor lets every chat make
+    progress concurrently, up to ``max_concurrent_updates``, while a chat's own
+    updates keep their order so conversation states are never raced. The
+    concurrency limit is applied by the base class before the chat lock.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        """Initialize the PerChatUpdateProcessor
+
+        Args:
+            max_concurrent_updates (int): Maximum number of updates handled at once
+        """
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+        self._waiters = {}
+
+    async def do_process_update(self, update, coroutine):
+        """Run the handler coroutine once earlier updates from its chat are done
+
+        Args:
+            update: The update object from Telegram
+            coroutine: The coroutine that dispatches the update to the handlers
+        """
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            await coroutine
+            return
+
+        chat_id = chat.id
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._waiters[chat_id] = self._waiters.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            # Forget the lock once no update from this chat is pending
+            self._waiters[chat_id] -= 1
+            if not self._waiters[chat_id]:
+                del self._waiters[chat_id]
+                del self._locks[chat_id]
+
+    async def initialize(self):
+        logger.info("Per-chat update processor started (max {} concurrent updates)", self.max_concurrent_updates)
+
+    async def shutdown(self):
+        self._locks.clear()
+        self._waiters.clear()
@@ -6,14 +6,41 @@ load_dotenv()
 
 # Telegram Bot Configuration
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
+RUN_MODE = os.getenv('RUN_MODE', 'polling')  # 'polling' or 'webhook'
+POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', '0.0'))
+POLL_TIMEOUT = int(os.getenv('POLL_TIMEOUT', '25'))  # long-poll hold time in seconds
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '256'))  # updates processed at once
+AI_WORKERS = int(os.getenv('AI_WORKERS', '32'))  # threads for blocking Gemini calls
+DB_WORKERS = int(os.getenv('DB_WORKERS', '32'))  # threads for blocking MongoDB calls
+
+# Webhook Configuration (used when RUN_MODE is 'webhook')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # public HTTPS base URL, e.g. https://bot.example.com
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
 
 # Gemini AI Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '20000'))  # cached therapist replies
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))  # seconds
+EMOTION_CACHE_SIZE = int(os.getenv('EMOTION_CACHE_SIZE', '8192'))  # cached emotion analyses
+EMOTION_CACHE_TTL = int(os.getenv('EMOTION_CACHE_TTL', '3600'))  # seconds
 
 # MongoDB Configuration
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 MONGODB_DB_NAME = os.getenv('MONGODB_DB_NAME', 'amira_db')
 
+# MongoDB connection pool (one shared client per process). These apply only
+# to options not already given in MONGODB_URI, e.g. ?maxPoolSize=256
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', str(CONCURRENT_UPDATES)))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '8'))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '60000'))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+
+# Redis Configuration (profile cache is disabled when REDIS_URL is not set)
+REDIS_URL = os.getenv('REDIS_URL')
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '60'))  # seconds
+
 # Application Configuration
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -25,6 +52,9 @@ SUPPORTED_CONDITIONS = [
     'ocd'
 ]
 
+# Conditions a patient can register with, for fast membership tests
+SUPPORTED_CONDITIONS_SET = frozenset(SUPPORTED_CONDITIONS + ['unknown'])
+
 # Supported Languages
 SUPPORTED_LANGUAGES = {
     'en': 'English',
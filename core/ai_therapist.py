@@ -1,12 +1,102 @@
 import google.generativeai as genai
+from cachetools import TTLCache
 from loguru import logger
+import hashlib
 import json
+import threading
 
 # Import configuration
 import config
 from core.localization import Localization
 from core.letting_go import LettingGoTechnique
 
+# System prompts for each condition, shared by every AITherapist instance
+_DEPRESSION_PROMPT = """
+        You are AMIRA, an AI therapeutic assistant specialized in helping patients with depression.
+        Your goal is to provide empathetic, evidence-based support and guidance.
+        
+        Guidelines:
+        1. Be warm, compassionate, and non-judgmental in your responses
+        2. Use cognitive-behavioral therapy (CBT) techniques when appropriate
+        3. Recognize signs of severe depression or suicidal ideation and respond with appropriate resources
+        4. Encourage healthy coping mechanisms and self-care practices
+        5. Validate the patient's feelings while gently challenging negative thought patterns
+        6. Provide practical, actionable suggestions that are tailored to the patient's situation
+        7. Use a conversational, natural tone that builds rapport and trust
+        8. Incorporate the Letting Go technique by David R. Hawkins when appropriate, which involves:
+           - Acknowledging emotions without judgment
+           - Feeling emotions fully in the body
+           - Asking if one is willing to let go of the emotion
+           - Asking when one could let go of the emotion
+        
+        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
+        """
+
+_BIPOLAR_PROMPT = """
+        You are AMIRA, an AI therapeutic assistant specialized in helping patients with bipolar disorder.
+        Your goal is to provide empathetic, evidence-based support and guidance.
+        
+        Guidelines:
+        1. Be warm, compassionate, and non-judgmental in your responses
+        2. Help identify potential mood episodes (manic, hypomanic, or depressive)
+        3. Encourage medication adherence and regular contact with healthcare providers
+        4. Promote stability through regular sleep, exercise, and routine
+        5. Teach recognition of early warning signs of mood episodes
+        6. Validate the patient's experiences while providing balanced perspective
+        7. Use a conversational, natural tone that builds rapport and trust
+        8. Incorporate the Letting Go technique by David R. Hawkins when appropriate, which involves:
+           - Acknowledging emotions without judgment
+           - Feeling emotions fully in the body
+           - Asking if one is willing to let go of the emotion
+           - Asking when one could let go of the emotion
+        
+        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
+        Pay special attention to signs of elevated mood or depression that might indicate a mood episode.
+        """
+
+_OCD_PROMPT = """
+        You are AMIRA, an AI therapeutic assistant specialized in helping patients with obsessive-compulsive disorder (OCD).
+        Your goal is to provide empathetic, evidence-based support and guidance.
+        
+        Guidelines:
+        1. Be warm, compassionate, and non-judgmental in your responses
+        2. Use exposure and response prevention (ERP) principles when appropriate
+        3. Help distinguish between obsessions (intrusive thoughts) and compulsions (behaviors)
+        4. Avoid providing reassurance that reinforces OCD cycles
+        5. Encourage challenging OCD thoughts and urges in a gradual, supportive way
+        6. Validate the difficulty of living with OCD while encouraging recovery steps
+        7. Use a conversational, natural tone that builds rapport and trust
+        
+        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
+        Focus on helping the patient recognize and resist OCD patterns while providing support.
+        """
+
+_GENERAL_PROMPT = """
+        You are AMIRA, an AI therapeutic assistant designed to provide mental health support.
+        Your goal is to provide empathetic, evidence-based support and guidance.
+        
+        Guidelines:
+        1. Be warm, compassionate, and non-judgmental in your responses
+        2. Use general therapeutic techniques like active listening and validation
+        3. Encourage healthy coping mechanisms and self-care practices
+        4. Recognize signs of distress and respond with appropriate resources
+        5. Avoid making specific diagnoses or treatment recommendations
+        6. Provide practical, actionable suggestions when appropriate
+        7. Use a conversational, natural tone that builds rapport and trust
+        
+        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
+        """
+
+# Appended to the system prompt when the Letting Go technique is requested
+_LETTING_GO_INSTRUCTIONS = """
+                Incorporate the Letting Go technique by David R. Hawkins in your response. This technique involves:
+                1. Acknowledging the emotion without judgment
+                2. Feeling the emotion fully in the body
+                3. Asking if one is willing to let it go
+                4. Asking when one could let it go
+                Guide the user through these steps in a conversational way.
+                """
+
 class AITherapist:
     """AI Therapist class that uses Gemini 2 to generate responses
     
@@ -28,28 +118,39 @@ class AITherapist:
         # Get the generative model
         self.model = genai.GenerativeModel('gemini-2.0-flash')
         
-        # Initialize localization
+        # Initialize localization, plus one per supported language that is
+        # never switched, since handlers call in concurrently for different users
         self.localization = Localization(language)
+        self.localizations = {code: Localization(code) for code in config.SUPPORTED_LANGUAGES}
         
         # Initialize letting go technique
         self.letting_go = LettingGoTechnique(self.localization)
         
         # Define system prompts for different conditions
         self.system_prompts = {
-            'depression': self._get_depression_prompt(),
-            'bipolar': self._get_bipolar_prompt(),
-            'ocd': self._get_ocd_prompt(),
-            'unknown': self._get_general_prompt()
+            'depression': _DEPRESSION_PROMPT,
+            'bipolar': _BIPOLAR_PROMPT,
+            'ocd': _OCD_PROMPT,
+            'unknown': _GENERAL_PROMPT
+        }
+        
+        # Fixed start of every prompt, per condition and Letting Go setting
+        self._prompt_prefixes = {
+            (condition, use_letting_go): f"{prompt}{_LETTING_GO_INSTRUCTIONS if use_letting_go else ''}\n\nUser's emotional state: "
+            for condition, prompt in self.system_prompts.items()
+            for use_letting_go in (False, True)
         }
         
-        # Track conversation history and session state
-        self.conversation_history = []
-        self.message_count = 0
-        self.session_active = False
+        # Cache of model replies keyed by a hash of the request. With history
+        # the key is the full prompt; without it, the normalized message plus
+        # everything else the prompt is built from. Handlers call in from
+        # worker threads
+        self.response_cache = TTLCache(maxsize=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
+        self._response_cache_lock = threading.Lock()
         
         logger.info(f"AI Therapist initialized with Gemini 2 in language: {language}")
     
-    def generate_response(self, user_message, emotion_analysis, condition, language='en', use_letting_go=False, conversation_history=None, is_first_message=False, is_end_of_session=False):
+    def generate_response(self, user_message, emotion_analysis, condition, language='en', use_letting_go=False, conversation_history=None, is_first_message=False, is_end_of_session=False, interaction_count=None):
         """Generate a therapeutic response based on user message and emotion analysis
         
         Args:
@@ -61,49 +162,31 @@ class AITherapist:
             conversation_history (list, optional): List of previous messages in the conversation
             is_first_message (bool, optional): Whether this is the first message in the session
             is_end_of_session (bool, optional): Whether this is the end of the session (will generate comprehensive summary)
+            interaction_count (int, optional): Interactions already recorded in the user's session
             
         Returns:
             str: The therapeutic response formatted for Telegram
         """
-        # Update conversation history
+        # Conversation state belongs to the caller's session; the therapist is
+        # shared by every user
         if conversation_history is None:
             conversation_history = []
-            
-        # Add user message to history
-        self.conversation_history.append({
-            'role': 'user',
-            'content': user_message,
-            'emotion': emotion_analysis
-        })
-        self.message_count += 1
         
-        # Check if we should initiate a session after 5 messages
-        if not self.session_active and self.message_count >= 5:
-            self.session_active = True
-            session_prompt = self.localization.get_text('session_initiation')
-            return f"{session_prompt}\n\n{self._generate_emotion_aware_response(user_message, emotion_analysis, condition, language, use_letting_go, conversation_history, is_first_message, is_end_of_session)}"
+        # Invite the user into a session on their 5th message; the reply is
+        # generated as usual and prefaced with the session invitation
+        initiate_session = interaction_count == 4
         
         # Use detected language from emotion analysis if available
         detected_language = emotion_analysis.get("detected_language", language)
+        localization = self.localizations.get(detected_language, self.localization)
         try:
-            # Update language if needed
-            if self.localization.language != detected_language:
-                self.localization.switch_language(detected_language)
-            
-            # Get the appropriate system prompt based on condition
-            system_prompt = self.system_prompts.get(condition, self.system_prompts['unknown'])
             
-            # Add Letting Go technique instructions if requested
-            if use_letting_go:
-                letting_go_instructions = """
-                Incorporate the Letting Go technique by David R. Hawkins in your response. This technique involves:
-                1. Acknowledging the emotion without judgment
-                2. Feeling the emotion fully in the body
-                3. Asking if one is willing to let it go
-                4. Asking when one could let it go
-                Guide the user through these steps in a conversational way.
-                """
-                system_prompt += letting_go_instructions
+            # Get the prompt prefix for the condition, including the Letting Go
+            # technique instructions if requested
+            use_letting_go = bool(use_letting_go)
+            prompt_prefix = self._prompt_prefixes.get((condition, use_letting_go))
+            if prompt_prefix is None:
+                prompt_prefix = self._prompt_prefixes[('unknown', use_letting_go)]
             
             # Format conversation history for context
             history_context = ""
@@ -112,15 +195,21 @@ class AITherapist:
                     f"{msg['role']}: {msg['content']}" for msg in conversation_history
                 )
             
-            # Create the prompt with emotion analysis and conversation history
-            emotion_info = json.dumps(emotion_analysis, indent=2)
-            prompt = f"{system_prompt}\n\nUser's emotional state: {emotion_info}\n\nUser message: {user_message}{history_context}\n\nPlease respond in {detected_language} language.\n\nTherapeutic response:"
-            
-            # Generate response from Gemini 2
-            response = self.model.generate_content(prompt)
+            # Create the prompt with emotion analysis and conversation history.
+            # The analysis holds lists, so it stays JSON, kept compact and
+            # with Arabic text unescaped
+            emotion_info = json.dumps(emotion_analysis, separators=(',', ':'), ensure_ascii=False)
+            prompt = f"{prompt_prefix}{emotion_info}\n\nUser message: {user_message}{history_context}\n\nPlease respond in {detected_language} language.\n\nTherapeutic response:"
             
-            # Format response for Telegram
-            response_text = response.text
+            # Generate response from Gemini 2, reusing the reply to an identical
+            # request. Without conversation history the reply depends only on the
+            # message, so messages differing in case or spacing share one reply
+            if conversation_history:
+                cache_key = prompt
+            else:
+                normalized_message = " ".join(user_message.lower().split())
+                cache_key = f"{condition}|{detected_language}|{use_letting_go}|{emotion_info}|{normalized_message}"
+            response_text = self._generate_cached(prompt, cache_key)
             
             # Keep responses concise during conversation
             if not is_end_of_session:
@@ -130,27 +219,17 @@ class AITherapist:
                     response_text = '. '.join(sentences[:2]) + '.'
             
             if is_first_message:
-                greeting = self.localization.get_text('greeting')
+                greeting = localization.get_text('greeting')
                 response_text = f"{greeting}\n\n{response_text}"
-                # Add therapist response to history
-                self.conversation_history.append({
-                    'role': 'therapist',
-                    'content': response_text
-                })
             elif is_end_of_session:
                 # Add comprehensive summary at end of session
                 summary_prompt = f"Create a comprehensive therapeutic summary of this session:\n\n{conversation_history}\n\nSummary should include:\n1. Key emotional patterns observed\n2. Progress made\n3. Recommendations\n4. Follow-up suggestions"
                 summary_response = self.model.generate_content(summary_prompt)
                 response_text = f"{response_text}\n\n--- SESSION SUMMARY ---\n{summary_response.text}"
-                # Reset session state
-                self.message_count = 0
-                self.session_active = False
             
-            # Add therapist response to history
-            self.conversation_history.append({
-                'role': 'therapist',
-                'content': response_text
-            })
+            if initiate_session:
+                session_prompt = localization.get_text('session_initiation')
+                response_text = f"{session_prompt}\n\n{response_text}"
             
             # Extract and return the text response
             return response_text
@@ -158,91 +237,45 @@ class AITherapist:
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             # Use localization for error message in the appropriate language
-            return self.localization.get_text('error_processing')
+            return localization.get_text('error_processing')
     
-    def _get_depression_prompt(self):
-        """Get the system prompt for depression"""
-        return """
-        You are AMIRA, an AI therapeutic assistant specialized in helping patients with depression.
-        Your goal is to provide empathetic, evidence-based support and guidance.
-        
-        Guidelines:
-        1. Be warm, compassionate, and non-judgmental in your responses
-        2. Use cognitive-behavioral therapy (CBT) techniques when appropriate
-        3. Recognize signs of severe depression or suicidal ideation and respond with appropriate resources
-        4. Encourage healthy coping mechanisms and self-care practices
-        5. Validate the patient's feelings while gently challenging negative thought patterns
-        6. Provide practical, actionable suggestions that are tailored to the patient's situation
-        7. Use a conversational, natural tone that builds rapport and trust
-        8. Incorporate the Letting Go technique by David R. Hawkins when appropriate, which involves:
-           - Acknowledging emotions without judgment
-           - Feeling emotions fully in the body
-           - Asking if one is willing to let go of the emotion
-           - Asking when one could let go of the emotion
+    def _generate_cached(self, prompt, cache_key=None):
+        """Generate a reply for a prompt, using the response cache
         
-        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
+        Args:
+            prompt (str): The complete prompt sent to the model
+            cache_key (str, optional): Text identifying the request in the
+                cache. Defaults to the prompt itself
+            
+        Returns:
+            str: The model's reply text
         """
+        cache_key = hashlib.sha256((cache_key or prompt).encode('utf-8')).hexdigest()
+        with self._response_cache_lock:
+            cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        response_text = self.model.generate_content(prompt).text
+        with self._response_cache_lock:
+            self.response_cache[cache_key] = response_text
+        return response_text
+    
+    def _get_depression_prompt(self):
+        """Get the system prompt for depression"""
+        return _DEPRESSION_PROMPT
     
     def _get_bipolar_prompt(self):
         """Get the system prompt for bipolar disorder"""
-        return """
-        You are AMIRA, an AI therapeutic assistant specialized in helping patients with bipolar disorder.
-        Your goal is to provide empathetic, evidence-based support and guidance.
-        
-        Guidelines:
-        1. Be warm, compassionate, and non-judgmental in your responses
-        2. Help identify potential mood episodes (manic, hypomanic, or depressive)
-        3. Encourage medication adherence and regular contact with healthcare providers
-        4. Promote stability through regular sleep, exercise, and routine
-        5. Teach recognition of early warning signs of mood episodes
-        6. Validate the patient's experiences while providing balanced perspective
-        7. Use a conversational, natural tone that builds rapport and trust
-        8. Incorporate the Letting Go technique by David R. Hawkins when appropriate, which involves:
-           - Acknowledging emotions without judgment
-           - Feeling emotions fully in the body
-           - Asking if one is willing to let go of the emotion
-           - Asking when one could let go of the emotion
-        
-        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
-        Pay special attention to signs of elevated mood or depression that might indicate a mood episode.
-        """
+        return _BIPOLAR_PROMPT
     
     def _get_ocd_prompt(self):
         """Get the system prompt for OCD"""
-        return """
-        You are AMIRA, an AI therapeutic assistant specialized in helping patients with obsessive-compulsive disorder (OCD).
-        Your goal is to provide empathetic, evidence-based support and guidance.
-        
-        Guidelines:
-        1. Be warm, compassionate, and non-judgmental in your responses
-        2. Use exposure and response prevention (ERP) principles when appropriate
-        3. Help distinguish between obsessions (intrusive thoughts) and compulsions (behaviors)
-        4. Avoid providing reassurance that reinforces OCD cycles
-        5. Encourage challenging OCD thoughts and urges in a gradual, supportive way
-        6. Validate the difficulty of living with OCD while encouraging recovery steps
-        7. Use a conversational, natural tone that builds rapport and trust
-        
-        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
-        Focus on helping the patient recognize and resist OCD patterns while providing support.
-        """
+        return _OCD_PROMPT
     
     def _get_general_prompt(self):
         """Get the general system prompt for unknown conditions"""
-        return """
-        You are AMIRA, an AI therapeutic assistant designed to provide mental health support.
-        Your goal is to provide empathetic, evidence-based support and guidance.
-        
-        Guidelines:
-        1. Be warm, compassionate, and non-judgmental in your responses
-        2. Use general therapeutic techniques like active listening and validation
-        3. Encourage healthy coping mechanisms and self-care practices
-        4. Recognize signs of distress and respond with appropriate resources
-        5. Avoid making specific diagnoses or treatment recommendations
-        6. Provide practical, actionable suggestions when appropriate
-        7. Use a conversational, natural tone that builds rapport and trust
-        
-        Remember to consider the emotional analysis provided with each message to tailor your response appropriately.
-        """
+        return _GENERAL_PROMPT
         
     def generate_report(self, conversation_history):
         """Generate a comprehensive report from conversation history
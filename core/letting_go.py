@@ -127,12 +127,17 @@ class LettingGoTechnique:
         # This would typically analyze session data to measure progress
         # For now, we'll return a simple metrics object
         
-        # Count interactions where letting go was used
-        letting_go_count = 0
-        for interaction in session_data.get('interactions', []):
-            metadata = interaction.get('metadata', {})
-            if metadata.get('technique') == 'letting_go':
-                letting_go_count += 1
+        # Count interactions where letting go was used. The session keeps a
+        # running count, since it holds only its most recent interactions
+        technique_counts = session_data.get('metadata', {}).get('technique_counts')
+        if technique_counts is not None:
+            letting_go_count = technique_counts.get('letting_go', 0)
+        else:
+            letting_go_count = 0
+            for interaction in session_data.get('interactions', []):
+                metadata = interaction.get('metadata', {})
+                if metadata.get('technique') == 'letting_go':
+                    letting_go_count += 1
         
         # Calculate simple metrics
         metrics = {
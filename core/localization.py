@@ -4,6 +4,8 @@ This module provides multilingual support for the AMIRA bot,
 currently supporting English and Arabic (Egyptian dialect).
 """
 
+from functools import lru_cache
+
 class Localization:
     """Localization class for handling multilingual support
     
@@ -36,16 +38,12 @@ class Localization:
         Returns:
             str: The localized text
         """
-        if self.language == self.ARABIC:
-            text = self.ARABIC_TEXTS.get(key, self.ENGLISH_TEXTS.get(key, key))
-        else:
-            text = self.ENGLISH_TEXTS.get(key, key)
-        
-        # Format the text with provided parameters
-        if kwargs:
-            text = text.format(**kwargs)
-        
-        return text
+        # Only the raw text is cached; parameters such as user names are
+        # formatted in per call
+        text = _lookup_text(self.language, key)
+        if not kwargs:
+            return text
+        return text.format(**kwargs)
     
     def switch_language(self, language):
         """Switch the current language
@@ -135,6 +133,7 @@ class Localization:
         
         # Session management
         'session_started': "A new session has started. How can I help you today?",
+        'session_initiation': "We've been talking for a little while now, so let's make this a proper session and look more closely at how you're feeling.",
         'session_resumed': "Session resumed. Where did we leave off?",
         'session_ended': "Session ended. Thank you for your time.",
         'session_timeout': "It seems we haven't been talking for a while. Would you like to end this session or continue?",
@@ -250,6 +249,7 @@ class Localization:
         
         # Session management
         'session_started': "بدأت جلسة جديدة. كيف يمكنني مساعدتك اليوم؟",
+        'session_initiation': "بقالنا شوية بنتكلم، فخلينا نعتبرها جلسة ونبص بشكل أقرب على إحساسك.",
         'session_resumed': "تم استئناف الجلسة. أين توقفنا؟",
         'session_ended': "انتهت الجلسة. شكرا لك على وقتك.",
         'session_timeout': "يبدو أننا لم نتحدث لفترة. هل ترغب في إنهاء هذه الجلسة أم الاستمرار؟",
@@ -310,4 +310,20 @@ class Localization:
         'daily_reflection': "ما هو الشيء الإيجابي الذي حدث اليوم؟",
         'weekly_goal': "هل ترغب في تحديد هدف صغير لهذا الأسبوع؟",
         'goal_followup': "كيف كان أداؤك مع الهدف الذي حددناه في المرة الماضية؟"
-    }
\ No newline at end of file
+    }
+
+
+@lru_cache(maxsize=1024)
+def _lookup_text(language, key):
+    """Get the raw text for a key, falling back to English and then to the key
+
+    Args:
+        language (str): Language code ('en' or 'ar')
+        key (str): The text key to translate
+
+    Returns:
+        str: The unformatted localized text
+    """
+    if language == Localization.ARABIC:
+        return Localization.ARABIC_TEXTS.get(key, Localization.ENGLISH_TEXTS.get(key, key))
+    return Localization.ENGLISH_TEXTS.get(key, key)
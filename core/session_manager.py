@@ -1,39 +1,69 @@
+from collections import Counter
 from datetime import datetime
+from uuid import uuid4
 from typing import Dict, List, Optional
 from loguru import logger
 from core.localization import Localization
 from bson import ObjectId
 
+# Emotions used to judge how a session is going
+POSITIVE_EMOTIONS = frozenset({'joy', 'happiness', 'calm', 'contentment', 'relief'})
+NEGATIVE_EMOTIONS = frozenset({'anger', 'fear', 'sadness', 'disgust', 'anxiety', 'stress'})
+
+def new_session_id() -> str:
+    """Generate an ID for a new session
+    
+    IDs must be unique even for sessions started in the same instant, since
+    interactions are upserted into the session document by its ID.
+    
+    Returns:
+        str: A random hex session ID, safe to use in callback data
+    """
+    return uuid4().hex
+
 class SessionManager:
+    # Interactions and conversation history entries kept in memory per session;
+    # the full interaction list lives only in the stored session document
+    TAIL_SIZE = 20
+    
     def __init__(self, db, language='en'):
         self.db = db
         self.localization = Localization(language)
+        
+        # One localization per language, never switched, so concurrent calls
+        # for users with different languages cannot interfere
+        self.localizations = {code: Localization(code) for code in (Localization.ENGLISH, Localization.ARABIC)}
     
     def start_session(self, patient_id) -> Dict:
         """Start a new session for a patient
         
+        Nothing is written yet: the session document is created by the upsert
+        of its first interaction, or by end_session.
+        
         Args:
             patient_id: The patient's ID
             
         Returns:
             Dict: The session object
         """
+        now = datetime.now()
         session = {
             'patient_id': patient_id,
-            'session_id': str(datetime.now().timestamp()),
-            'start_time': datetime.now(),
+            'session_id': new_session_id(),
+            'start_time': now,
             'interactions': [],
-            'metadata': {'techniques_used': []},
+            'metadata': {'technique_counts': {}},
             'conversation_history': []
         }
         return session
     
     def create_session(self, user_id: int, language: str = 'en') -> Dict:
         """Create a new session for a user"""
+        now = datetime.now()
         session = {
             'user_id': user_id,
-            'session_id': str(datetime.now().timestamp()),
-            'start_time': datetime.now(),
+            'session_id': new_session_id(),
+            'start_time': now,
             'language': language,
             'messages': [],
             'emotional_states': [],
@@ -53,7 +83,7 @@ class SessionManager:
         """Get the complete conversation history for a session"""
         return self.db.get_session_messages(session_id)
         
-    def add_interaction(self, session, user_message, bot_response, emotion_analysis) -> Dict:
+    def add_interaction(self, session, user_message, bot_response, emotion_analysis, metadata=None) -> Dict:
         """Add an interaction to the session and update conversation history
         
         Args:
@@ -61,22 +91,33 @@ class SessionManager:
             user_message: The message from the user
             bot_response: The response from the bot
             emotion_analysis: Emotional analysis of the user message
+            metadata (dict, optional): Details of how the response was made,
+                such as the technique used
             
         Returns:
             Dict: The updated session object
         """
-        # Create interaction object
+        # Create interaction object; everything recorded for it shares one timestamp
+        now = datetime.now()
         interaction = {
-            'timestamp': datetime.now(),
+            'timestamp': now,
             'user_message': user_message,
             'bot_response': bot_response,
             'emotion_analysis': emotion_analysis
         }
+        if metadata:
+            interaction['metadata'] = metadata
         
-        # Add to interactions list
+        # Add to the rolling tail of recent interactions
         if 'interactions' not in session:
             session['interactions'] = []
         session['interactions'].append(interaction)
+        del session['interactions'][:-self.TAIL_SIZE]
+        session['interaction_count'] = session.get('interaction_count', 0) + 1
+        
+        # Persist only the new interaction
+        if 'session_id' in session:
+            self.record_interaction(session, interaction)
         
         # Update conversation history
         if 'conversation_history' not in session:
@@ -84,33 +125,90 @@ class SessionManager:
         session['conversation_history'].append({
             'role': 'user',
             'content': user_message,
-            'timestamp': datetime.now()
+            'timestamp': now
         })
         session['conversation_history'].append({
             'role': 'assistant',
             'content': bot_response,
-            'timestamp': datetime.now()
+            'timestamp': now
         })
+        del session['conversation_history'][:-self.TAIL_SIZE]
         
         # Update emotional state if available
         if emotion_analysis and 'dominant_emotion' in emotion_analysis:
             self.update_emotional_state(
-                session.get('session_id', str(datetime.now().timestamp())),
+                session.get('session_id') or new_session_id(),
                 emotion_analysis['dominant_emotion'],
-                emotion_analysis.get('intensity', 0.5)
+                emotion_analysis.get('intensity', 0.5),
+                timestamp=now
             )
             
             # Update diagnosis progress based on emotion
             if 'condition' in session:
                 progress = self._calculate_progress(session['condition'], emotion_analysis)
                 self.update_diagnosis_progress(
-                    session.get('session_id', str(datetime.now().timestamp())),
+                    session.get('session_id') or new_session_id(),
                     session['condition'],
                     progress
                 )
         
         return session
         
+    def record_interaction(self, session, interaction) -> None:
+        """Append an interaction to the stored session document
+        
+        Only the new interaction is sent, so the write size does not grow with
+        the length of the session. The first interaction creates the document,
+        so starting a session costs no round trip.
+        
+        Args:
+            session: The current session object, including its session_id
+            interaction: The interaction to append
+        """
+        self.db.sessions.update_one(
+            {'session_id': session['session_id']},
+            {
+                '$push': {'interactions': interaction},
+                '$set': {'end_time': interaction['timestamp']},
+                '$setOnInsert': {
+                    'patient_id': session.get('patient_id'),
+                    'user_id': session.get('user_id'),
+                    'start_time': session.get('start_time', interaction['timestamp']),
+                    'language': session.get('language', 'en')
+                }
+            },
+            upsert=True
+        )
+        
+    def _technique_count(self, session, technique):
+        """Get how many times a technique was used in a session
+        
+        Args:
+            session: The session object
+            technique (str): Technique name, e.g. 'letting_go'
+            
+        Returns:
+            int: Number of responses that used the technique
+        """
+        metadata = session.get('metadata', {})
+        technique_counts = metadata.get('technique_counts')
+        if technique_counts is not None:
+            return technique_counts.get(technique, 0)
+        
+        # Sessions stored before the counts were kept list every use
+        return metadata.get('techniques_used', []).count(technique)
+        
+    def _localization(self, language):
+        """Get the shared localization for a language
+        
+        Args:
+            language (str): Language code ('en' or 'ar')
+            
+        Returns:
+            Localization: Localization for the language, or the default one
+        """
+        return self.localizations.get(language, self.localization)
+        
     def _calculate_progress(self, condition, emotion_analysis):
         """Calculate progress for a condition based on emotional analysis
         
@@ -122,18 +220,17 @@ class SessionManager:
             float: Progress value between 0 and 1
         """
         # Simple implementation - can be enhanced with more sophisticated algorithms
-        positive_emotions = ['joy', 'happiness', 'calm', 'contentment', 'relief']
         if emotion_analysis and 'dominant_emotion' in emotion_analysis:
-            if emotion_analysis['dominant_emotion'].lower() in positive_emotions:
+            if emotion_analysis['dominant_emotion'].lower() in POSITIVE_EMOTIONS:
                 return 0.1  # Small progress for positive emotions
         return 0.05  # Minimal progress for other emotions
     
-    def update_emotional_state(self, session_id: str, emotion: str, intensity: float) -> None:
+    def update_emotional_state(self, session_id: str, emotion: str, intensity: float, timestamp: Optional[datetime] = None) -> None:
         """Update the emotional state tracking for the session"""
         emotional_state = {
             'emotion': emotion,
             'intensity': intensity,
-            'timestamp': datetime.now()
+            'timestamp': timestamp or datetime.now()
         }
         self.db.update_session_emotional_state(session_id, emotional_state)
     
@@ -153,7 +250,6 @@ class SessionManager:
     def set_session_language(self, session_id: str, language: str) -> None:
         """Set the language for a session"""
         self.db.update_session_language(session_id, language)
-        self.localization.switch_language(language)
     
     def get_session_summary(self, session_id: str, language: str = None) -> Dict:
         """Get a summary of the session including progress and emotional states"""
@@ -161,9 +257,6 @@ class SessionManager:
         if not session:
             return None
             
-        if language:
-            self.localization.switch_language(language)
-            
         summary = {
             'start_time': session['start_time'],
             'message_count': len(session.get('messages', [])),
@@ -174,24 +267,24 @@ class SessionManager:
         
         # Localize summary if language is Arabic
         if language == 'ar':
-            summary = self._localize_summary(summary)
+            summary = self._localize_summary(summary, self._localization(language))
             
         return summary
     
-    def _localize_summary(self, summary: Dict) -> Dict:
+    def _localize_summary(self, summary: Dict, localization: Localization) -> Dict:
         """Localize the summary content to Arabic"""
         localized = summary.copy()
         
         # Localize emotional states
         if 'emotional_states' in localized:
             for state in localized['emotional_states']:
-                state['emotion'] = self.localization.get_text(state['emotion'])
+                state['emotion'] = localization.get_text(state['emotion'])
                 
         # Localize progress metrics
         if 'progress' in localized:
             localized_progress = {}
             for key, value in localized['progress'].items():
-                localized_key = self.localization.get_text(key)
+                localized_key = localization.get_text(key)
                 localized_progress[localized_key] = value
             localized['progress'] = localized_progress
             
@@ -207,26 +300,37 @@ class SessionManager:
             str: The session ID
         """
         # Set end time
-        session['end_time'] = datetime.now()
+        now = datetime.now()
+        session['end_time'] = now
         
         # Calculate session duration
-        start_time = session.get('start_time', datetime.now())
+        start_time = session.get('start_time', now)
         session['duration'] = (session['end_time'] - start_time).total_seconds() / 60  # in minutes
         
-        # Generate simple summary
-        session['summary'] = self._generate_session_summary(session)
-        
         # Save to database
         if 'session_id' in session:
+            # Summarize every stored interaction, not just the in-memory tail
+            stored = self.db.sessions.find_one(
+                {'session_id': session['session_id']},
+                {'interactions.emotion_analysis': 1}
+            )
+            if stored and 'interactions' in stored:
+                session['summary'] = self._generate_session_summary({**session, 'interactions': stored['interactions']})
+            else:
+                session['summary'] = self._generate_session_summary(session)
+            
+            # The stored interactions were pushed one by one; keep them
+            fields = {key: value for key, value in session.items() if key not in ('_id', 'interactions')}
             self.db.sessions.update_one(
                 {'session_id': session['session_id']},
-                {'$set': session},
+                {'$set': fields},
                 upsert=True
             )
             return session['session_id']
         else:
             # If no session_id, create one
-            session['session_id'] = str(datetime.now().timestamp())
+            session['summary'] = self._generate_session_summary(session)
+            session['session_id'] = new_session_id()
             self.db.sessions.insert_one(session)
             return session['session_id']
     
@@ -241,7 +345,7 @@ class SessionManager:
         """
         # Get language
         lang = session.get('language', 'en')
-        self.localization.switch_language(lang)
+        localization = self._localization(lang)
         
         # Count interactions
         interaction_count = len(session.get('interactions', []))
@@ -252,30 +356,22 @@ class SessionManager:
             if 'emotion_analysis' in interaction and 'dominant_emotion' in interaction['emotion_analysis']:
                 emotions.append(interaction['emotion_analysis']['dominant_emotion'].lower())
         
-        # Count emotion frequencies
-        emotion_counts = {}
-        for emotion in emotions:
-            if emotion in emotion_counts:
-                emotion_counts[emotion] += 1
-            else:
-                emotion_counts[emotion] = 1
-        
-        # Get top emotions
-        top_emotions = sorted(emotion_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+        # Count emotion frequencies and get the top emotions
+        top_emotions = Counter(emotions).most_common(3)
         
         # Generate summary text
         if lang == 'ar':
-            summary = f"جلسة مع {interaction_count} تفاعلات. "
+            parts = [f"جلسة مع {interaction_count} تفاعلات. "]
             if top_emotions:
-                summary += "المشاعر السائدة: "
-                summary += ", ".join([self.localization.get_text(emotion) for emotion, _ in top_emotions])
+                parts.append("المشاعر السائدة: ")
+                parts.append(", ".join(localization.get_text(emotion) for emotion, _ in top_emotions))
         else:
-            summary = f"Session with {interaction_count} interactions. "
+            parts = [f"Session with {interaction_count} interactions. "]
             if top_emotions:
-                summary += "Dominant emotions: "
-                summary += ", ".join([emotion for emotion, _ in top_emotions])
+                parts.append("Dominant emotions: ")
+                parts.append(", ".join(emotion for emotion, _ in top_emotions))
         
-        return summary
+        return "".join(parts)
         
     def get_previous_session_report(self, patient_id):
         """Get a report of the previous session for a patient
@@ -286,9 +382,18 @@ class SessionManager:
         Returns:
             dict: Report data or None if no previous sessions
         """
-        # Find the most recent session for this patient
+        # Find the most recent session for this patient, fetching only the
+        # fields the report is built from
         previous_session = self.db.sessions.find_one(
             {'patient_id': patient_id},
+            {
+                'start_time': 1,
+                'language': 1,
+                'summary': 1,
+                'metadata.technique_counts': 1,
+                'metadata.techniques_used': 1,
+                'interactions.emotion_analysis.dominant_emotion': 1
+            },
             sort=[('start_time', -1)]
         )
         
@@ -297,10 +402,10 @@ class SessionManager:
         
         # Get language
         lang = previous_session.get('language', 'en')
-        self.localization.switch_language(lang)
+        localization = self._localization(lang)
         
         # Format date
-        session_date = previous_session.get('start_time', datetime.now()).strftime('%Y-%m-%d')
+        session_date = (previous_session.get('start_time') or datetime.now()).strftime('%Y-%m-%d')
         
         # Count interactions
         interaction_count = len(previous_session.get('interactions', []))
@@ -309,7 +414,7 @@ class SessionManager:
         report = {
             'session_date': session_date,
             'interaction_count': interaction_count,
-            'summary': previous_session.get('summary', self.localization.get_text('no_summary_available')),
+            'summary': previous_session.get('summary', localization.get_text('no_summary_available')),
             'emotional_trends': self._extract_emotional_trends(previous_session, lang),
             'progress_indicators': self._extract_progress_indicators(previous_session, lang),
             'recommendations': self._generate_recommendations(previous_session, lang)
@@ -338,22 +443,14 @@ class SessionManager:
         if not emotions:
             return trends
         
-        # Count emotion frequencies
-        emotion_counts = {}
-        for emotion in emotions:
-            if emotion in emotion_counts:
-                emotion_counts[emotion] += 1
-            else:
-                emotion_counts[emotion] = 1
-        
-        # Get top emotions
-        top_emotions = sorted(emotion_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+        # Count emotion frequencies and get the top emotions
+        top_emotions = Counter(emotions).most_common(3)
         
         # Generate trend descriptions
         for emotion, count in top_emotions:
             percentage = int((count / len(emotions)) * 100)
             if lang == 'ar':
-                trends.append(f"{self.localization.get_text(emotion)}: {percentage}% من التفاعلات")
+                trends.append(f"{self._localization(lang).get_text(emotion)}: {percentage}% من التفاعلات")
             else:
                 trends.append(f"{emotion.capitalize()}: {percentage}% of interactions")
         
@@ -372,8 +469,7 @@ class SessionManager:
         indicators = []
         
         # Check for techniques used
-        techniques = session.get('metadata', {}).get('techniques_used', [])
-        letting_go_count = techniques.count('letting_go')
+        letting_go_count = self._technique_count(session, 'letting_go')
         
         if letting_go_count > 0:
             if lang == 'ar':
@@ -392,14 +488,11 @@ class SessionManager:
             second_half = emotions[len(emotions)//2:]
             
             # Check if emotions improved in second half
-            positive_emotions = ['joy', 'happiness', 'calm', 'contentment', 'relief']
-            negative_emotions = ['anger', 'fear', 'sadness', 'disgust', 'anxiety', 'stress']
-            
-            first_half_negative = sum(1 for e in first_half if e in negative_emotions)
-            second_half_negative = sum(1 for e in second_half if e in negative_emotions)
+            first_half_negative = sum(1 for e in first_half if e in NEGATIVE_EMOTIONS)
+            second_half_negative = sum(1 for e in second_half if e in NEGATIVE_EMOTIONS)
             
-            first_half_positive = sum(1 for e in first_half if e in positive_emotions)
-            second_half_positive = sum(1 for e in second_half if e in positive_emotions)
+            first_half_positive = sum(1 for e in first_half if e in POSITIVE_EMOTIONS)
+            second_half_positive = sum(1 for e in second_half if e in POSITIVE_EMOTIONS)
             
             if second_half_positive > first_half_positive:
                 if lang == 'ar':
@@ -428,8 +521,7 @@ class SessionManager:
         recommendations = []
         
         # Check for techniques used
-        techniques = session.get('metadata', {}).get('techniques_used', [])
-        letting_go_count = techniques.count('letting_go')
+        letting_go_count = self._technique_count(session, 'letting_go')
         
         if letting_go_count == 0:
             if lang == 'ar':
@@ -445,8 +537,7 @@ class SessionManager:
         
         if emotions:
             # Check for persistent negative emotions
-            negative_emotions = ['anger', 'fear', 'sadness', 'disgust', 'anxiety', 'stress']
-            negative_count = sum(1 for e in emotions if e in negative_emotions)
+            negative_count = sum(1 for e in emotions if e in NEGATIVE_EMOTIONS)
             
             if negative_count > len(emotions) * 0.7:  # More than 70% negative
                 if lang == 'ar':
@@ -0,0 +1,142 @@
+"""Patient profile cache for AMIRA
+
+This module wraps the MongoDB database with a two-level write-through cache
+for patient profiles (in-process TTL cache, then Redis), so conversation
+handlers do not need a MongoDB round trip on every Telegram update.
+"""
+
+import asyncio
+from bson import json_util
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+from redis.exceptions import RedisError
+from loguru import logger
+
+# Patient fields read by the bot; everything else stays on the server
+PATIENT_PROJECTION = {
+    "telegram_id": 1,
+    "name": 1,
+    "language": 1,
+    "condition": 1,
+    "registration_date": 1
+}
+
+class CachedUserStore:
+    """MongoDB database wrapper with a two-level cache for patient profiles
+
+    Profiles are first looked up in a per-process TTL cache, so the handlers
+    of a single update share one lookup. Below that they are cached in Redis
+    as extended JSON under ``amira:profile:<telegram_id>``. Both levels use
+    the same short TTL and are rewritten whenever a profile is updated
+    through this store. Cached documents are shared and must not be mutated.
+    Redis errors are logged and the store falls back to MongoDB, so an
+    unreachable Redis server only costs the shared cache.
+    Any other attribute (``patients``, ``sessions``, ``reports``, ...) is
+    delegated to the wrapped database, so the store can be used wherever the
+    database object was used before. Without a Redis client a local cache miss
+    goes straight to MongoDB.
+    """
+
+    KEY_PREFIX = 'amira:profile:'
+
+    def __init__(self, db, redis=None, ttl=60, local_size=10000):
+        """Initialize the CachedUserStore
+
+        Args:
+            db: MongoDB database connection
+            redis: redis.asyncio client, or None to disable the shared cache
+            ttl (int, optional): Seconds a cached profile stays valid
+            local_size (int, optional): Maximum profiles kept in the local cache
+        """
+        self.db = db
+        self.redis = redis
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=local_size, ttl=ttl)
+        logger.info(f"Patient profile cache initialized (Redis {'enabled' if redis is not None else 'disabled'})")
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __getitem__(self, name):
+        return self.db[name]
+
+    async def get_profile(self, telegram_id):
+        """Get a patient profile, trying the local cache and Redis before MongoDB
+
+        Args:
+            telegram_id (int): Telegram user ID
+
+        Returns:
+            dict: Patient document or None if the user is not registered
+        """
+        patient = self.local.get(telegram_id)
+        if patient is not None:
+            return patient
+
+        if self.redis is not None:
+            # Redis is optional; when it fails, read the profile from MongoDB
+            try:
+                cached = await self.redis.get(f"{self.KEY_PREFIX}{telegram_id}")
+            except RedisError as e:
+                logger.warning("Redis profile lookup failed, reading from MongoDB: {}", e)
+                cached = None
+            if cached:
+                patient = json_util.loads(cached)
+                self.local[telegram_id] = patient
+                return patient
+
+        patient = await asyncio.to_thread(
+            self.db.patients.find_one,
+            {"telegram_id": telegram_id},
+            PATIENT_PROJECTION
+        )
+        if patient:
+            await self.cache_profile(patient)
+        return patient
+
+    async def update_profile(self, telegram_id, fields, on_insert=None):
+        """Update a patient profile in MongoDB and refresh the cached copy
+
+        Args:
+            telegram_id (int): Telegram user ID
+            fields (dict): Fields to set on the patient document
+            on_insert (dict, optional): Fields set only when the document is
+                created. When given, a missing patient is inserted (upsert)
+
+        Returns:
+            dict: The updated patient document or None if it does not exist
+        """
+        update = {"$set": fields}
+        if on_insert is not None:
+            update["$setOnInsert"] = on_insert
+        patient = await asyncio.to_thread(
+            self.db.patients.find_one_and_update,
+            {"telegram_id": telegram_id},
+            update,
+            projection=PATIENT_PROJECTION,
+            upsert=on_insert is not None,
+            return_document=ReturnDocument.AFTER
+        )
+        if patient:
+            await self.cache_profile(patient)
+        return patient
+
+    async def cache_profile(self, patient):
+        """Store a patient document in both cache levels
+
+        Args:
+            patient (dict): Patient document including ``telegram_id``
+        """
+        self.local[patient['telegram_id']] = patient
+        if self.redis is None:
+            return
+
+        # A failed Redis write only costs other processes a MongoDB read
+        try:
+            await self.redis.setex(
+                f"{self.KEY_PREFIX}{patient['telegram_id']}",
+                self.ttl,
+                json_util.dumps(patient)
+            )
+        except RedisError as e:
+            logger.warning("Could not cache patient profile in Redis: {}", e)
@@ -1,3 +1,5 @@
+from urllib.parse import parse_qs, urlsplit
+
 from pymongo import MongoClient
 from loguru import logger
 
@@ -11,8 +13,21 @@ def initialize_database():
         pymongo.database.Database: MongoDB database object
     """
     try:
-        # Connect to MongoDB
-        client = MongoClient(config.MONGODB_URI)
+        # Connect to MongoDB with a pre-warmed connection pool. Keyword
+        # arguments override URI options, so pool settings already given in
+        # the URI are left out
+        uri_options = {key.lower() for key in parse_qs(urlsplit(config.MONGODB_URI).query)}
+        pool_options = {
+            name: value
+            for name, value in (
+                ('maxPoolSize', config.MONGODB_MAX_POOL_SIZE),
+                ('minPoolSize', config.MONGODB_MIN_POOL_SIZE),
+                ('maxIdleTimeMS', config.MONGODB_MAX_IDLE_TIME_MS),
+                ('waitQueueTimeoutMS', config.MONGODB_WAIT_QUEUE_TIMEOUT_MS)
+            )
+            if name.lower() not in uri_options
+        }
+        client = MongoClient(config.MONGODB_URI, **pool_options)
         db = client[config.MONGODB_DB_NAME]
         
         # Create necessary collections if they don't exist
@@ -29,12 +44,7 @@ def initialize_database():
             logger.info("Created 'reports' collection")
         
         # Create indexes for better query performance
-        db.patients.create_index('telegram_id', unique=True)
-        db.sessions.create_index('patient_id')
-        db.sessions.create_index('session_id')
-        db.sessions.create_index('user_id')
-        db.sessions.create_index([('patient_id', 1), ('start_time', -1)])
-        db.reports.create_index([('patient_id', 1), ('creation_date', -1)])
+        ensure_indexes(db)
         
         logger.info(f"Connected to MongoDB database: {config.MONGODB_DB_NAME}")
         return db
@@ -43,6 +53,31 @@ def initialize_database():
         logger.error(f"Error connecting to MongoDB: {e}")
         raise
 
+def ensure_indexes(db):
+    """Create the indexes used by the bot's queries
+    
+    create_index is idempotent, so this is safe to call on every startup.
+    
+    Args:
+        db: MongoDB database object
+    """
+    # Patient lookups by Telegram user
+    db.patients.create_index('telegram_id', unique=True)
+    
+    # Session upserts by session_id, which must never match another user's
+    # session, and lookups by Telegram user
+    db.sessions.create_index('session_id', unique=True)
+    db.sessions.create_index('user_id')
+    
+    # Latest sessions and session counts per patient; also serves plain
+    # patient_id lookups, so no separate patient_id index is needed
+    db.sessions.create_index([('patient_id', 1), ('start_time', -1)])
+    
+    # Latest reports per patient
+    db.reports.create_index([('patient_id', 1), ('creation_date', -1)])
+    
+    logger.info("MongoDB indexes ensured")
+
 # File system operations removed as per requirements
 # All patient data is now stored directly in MongoDB
 
@@ -1,4 +1,5 @@
 from datetime import datetime
+from uuid import uuid4
 from bson import ObjectId
 
 class Patient:
@@ -172,7 +173,7 @@ class Session:
             language (str, optional): Language used in the session ('en' or 'ar')
         """
         self.patient_id = patient_id
-        self.session_id = session_id or str(start_time.timestamp())
+        self.session_id = session_id or uuid4().hex
         self.user_id = user_id
         self.start_time = start_time
         self.end_time = end_time
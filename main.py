@@ -5,7 +5,7 @@ from loguru import logger
 import config
 
 # Import bot module
-from bot.bot import setup_bot
+from bot.bot import setup_bot, run_bot
 
 # Import database module
 from data.database import initialize_database
@@ -22,9 +22,14 @@ def main():
     logger.info("Database connection initialized")
     
     # Setup and run the Telegram bot
-    bot = setup_bot(db)
-    logger.info("Starting Telegram bot")
-    bot.run_polling()
+    bot = setup_bot(
+        db,
+        poll_interval=config.POLL_INTERVAL,
+        long_poll_timeout=config.POLL_TIMEOUT,
+        run_mode=config.RUN_MODE
+    )
+    logger.info(f"Starting Telegram bot ({config.RUN_MODE})")
+    run_bot(bot)
     
 if __name__ == "__main__":
     logger.info("Starting AMIRA - AI Mental Health Therapeutic Assistant")
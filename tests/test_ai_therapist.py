@@ -162,6 +162,58 @@ class TestAITherapist(unittest.TestCase):
         self.assertIn("unknown", self.therapist.system_prompts)
         self.assertIn("frustration", call_args)
     
+    def test_generate_response_cached(self):
+        """Test that an identical request reuses the cached reply"""
+        # Mock response data
+        mock_response = MagicMock()
+        mock_response.text = "That sounds hard. I'm here with you."
+        self.mock_model.generate_content.return_value = mock_response
+        
+        emotion_analysis = {"primary_emotion": "sadness"}
+        
+        # Call the generate_response method twice with the same input
+        first = self.therapist.generate_response("I feel sad", emotion_analysis, "depression")
+        second = self.therapist.generate_response("I feel sad", emotion_analysis, "depression")
+        
+        # Verify that the model was only called once
+        self.assertEqual(first, second)
+        self.mock_model.generate_content.assert_called_once()
+    
+    def test_generate_response_cached_normalized(self):
+        """Test that history-free messages differing in case and spacing share a reply"""
+        # Mock response data
+        mock_response = MagicMock()
+        mock_response.text = "Anxiety can feel overwhelming. Let's slow down together."
+        self.mock_model.generate_content.return_value = mock_response
+        
+        emotion_analysis = {"primary_emotion": "anxiety"}
+        
+        # Call the generate_response method with two spellings of the same message
+        self.therapist.generate_response("I'm anxious", emotion_analysis, "unknown")
+        self.therapist.generate_response("  i'm   ANXIOUS ", emotion_analysis, "unknown")
+        
+        # Verify that the model was only called once
+        self.mock_model.generate_content.assert_called_once()
+    
+    def test_generate_response_session_initiation(self):
+        """Test that only a session's fifth message is prefaced by the session invitation"""
+        # Mock response data
+        mock_response = MagicMock()
+        mock_response.text = "Let's take a breath together."
+        self.mock_model.generate_content.return_value = mock_response
+
+        emotion_analysis = {"primary_emotion": "stress"}
+        session_prompt = self.therapist.localization.get_text('session_initiation')
+
+        # Reply to the fifth message of a session, after four recorded interactions
+        result = self.therapist.generate_response("Message", emotion_analysis, "unknown", interaction_count=4)
+        self.assertEqual(result, f"{session_prompt}\n\n{mock_response.text}")
+
+        # Verify other messages, e.g. a new user's first, get a plain reply
+        for count in (0, 5):
+            result = self.therapist.generate_response("Message", emotion_analysis, "unknown", interaction_count=count)
+            self.assertEqual(result, mock_response.text)
+
     def test_generate_response_api_error(self):
         """Test handling of API errors"""
         # Configure the mock model to raise an exception
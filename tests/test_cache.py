@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+import asyncio
+import sys
+import os
+
+from bson import json_util
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.cache import CachedUserStore, PATIENT_PROJECTION
+
+class TestCachedUserStore(unittest.TestCase):
+    """Test cases for the CachedUserStore class"""
+
+    def setUp(self):
+        """Set up the test environment"""
+        # Mock database and Redis client
+        self.mock_db = MagicMock()
+        self.mock_redis = MagicMock()
+        self.mock_redis.get = AsyncMock(return_value=None)
+        self.mock_redis.setex = AsyncMock()
+
+        self.patient = {"_id": "abc", "telegram_id": 42, "name": "Sara", "language": "ar"}
+        self.store = CachedUserStore(self.mock_db, self.mock_redis, ttl=60)
+
+    def test_get_profile_local_hit(self):
+        """Test that a profile in the local cache needs neither Redis nor MongoDB"""
+        self.store.local[42] = self.patient
+
+        result = asyncio.run(self.store.get_profile(42))
+
+        self.assertIs(result, self.patient)
+        self.mock_redis.get.assert_not_called()
+        self.mock_db.patients.find_one.assert_not_called()
+
+    def test_get_profile_redis_hit(self):
+        """Test that a Redis hit is returned and kept in the local cache"""
+        self.mock_redis.get.return_value = json_util.dumps(self.patient)
+
+        result = asyncio.run(self.store.get_profile(42))
+
+        self.assertEqual(result, self.patient)
+        self.assertEqual(self.store.local[42], self.patient)
+        self.mock_db.patients.find_one.assert_not_called()
+
+    def test_get_profile_miss_reads_mongodb(self):
+        """Test that a cache miss falls through to MongoDB and fills both caches"""
+        self.mock_db.patients.find_one.return_value = self.patient
+
+        result = asyncio.run(self.store.get_profile(42))
+
+        self.assertEqual(result, self.patient)
+        self.mock_db.patients.find_one.assert_called_once_with({"telegram_id": 42}, PATIENT_PROJECTION)
+        self.assertEqual(self.store.local[42], self.patient)
+        self.mock_redis.setex.assert_awaited_once_with("amira:profile:42", 60, json_util.dumps(self.patient))
+
+    def test_get_profile_redis_down(self):
+        """Test that Redis errors fall back to MongoDB instead of failing"""
+        self.mock_redis.get.side_effect = RedisConnectionError("connection refused")
+        self.mock_redis.setex.side_effect = RedisConnectionError("connection refused")
+        self.mock_db.patients.find_one.return_value = self.patient
+
+        result = asyncio.run(self.store.get_profile(42))
+
+        self.assertEqual(result, self.patient)
+        self.assertEqual(self.store.local[42], self.patient)
+
+    def test_update_profile_writes_through(self):
+        """Test that an update refreshes both cache levels"""
+        self.store.local[42] = {"telegram_id": 42, "name": "Old"}
+        self.mock_db.patients.find_one_and_update.return_value = self.patient
+
+        result = asyncio.run(self.store.update_profile(42, {"name": "Sara"}))
+
+        self.assertEqual(result, self.patient)
+        self.assertEqual(self.store.local[42], self.patient)
+        self.mock_redis.setex.assert_awaited_once_with("amira:profile:42", 60, json_util.dumps(self.patient))
+
+    def test_update_profile_redis_down(self):
+        """Test that an update succeeds when Redis cannot be written"""
+        self.mock_redis.setex.side_effect = RedisConnectionError("connection refused")
+        self.mock_db.patients.find_one_and_update.return_value = self.patient
+
+        result = asyncio.run(self.store.update_profile(42, {"name": "Sara"}))
+
+        self.assertEqual(result, self.patient)
+        self.assertEqual(self.store.local[42], self.patient)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -49,6 +49,21 @@ class TestEmotionAnalyzer(unittest.TestCase):
         self.assertIn("catastrophizing", result["cognitive_patterns"])
         self.assertIn("social isolation", result["risk_factors"])
     
+    def test_analyze_cached(self):
+        """Test that repeated messages reuse the cached analysis"""
+        # Mock response data
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"primary_emotion": "joy", "detected_language": "en"})
+        self.mock_model.generate_content.return_value = mock_response
+        
+        # Call the analyze method with two spellings of the same message
+        first = self.analyzer.analyze("Thank you so much", language="en")
+        second = self.analyzer.analyze("  thank you SO much ", language="en")
+        
+        # Verify that the model was only called once
+        self.assertEqual(first, second)
+        self.mock_model.generate_content.assert_called_once()
+    
     def test_analyze_json_error(self):
         """Test handling of JSON parsing errors"""
         # Mock response with invalid JSON
@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+import asyncio
+import pickle
+import sys
+import os
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.persistence import RedisPersistence
+
+class TestRedisPersistence(unittest.TestCase):
+    """Test cases for the RedisPersistence class"""
+
+    def setUp(self):
+        """Set up the test environment"""
+        # Mock Redis client
+        self.mock_redis = MagicMock()
+        self.mock_redis.hgetall = AsyncMock(return_value={})
+        self.mock_redis.hset = AsyncMock()
+        self.mock_redis.set = AsyncMock()
+        self.persistence = RedisPersistence(self.mock_redis)
+
+    def test_get_conversations(self):
+        """Test that stored conversation states are loaded by chat and user"""
+        self.mock_redis.hgetall.return_value = {b"1:2": pickle.dumps(3)}
+
+        result = asyncio.run(self.persistence.get_conversations("amira_conversation"))
+
+        self.assertEqual(result, {(1, 2): 3})
+
+    def test_redis_down_on_load(self):
+        """Test that a failed load starts with empty conversation states"""
+        self.mock_redis.hgetall.side_effect = RedisConnectionError("connection refused")
+
+        result = asyncio.run(self.persistence.get_conversations("amira_conversation"))
+
+        self.assertEqual(result, {})
+
+    def test_redis_down_on_update(self):
+        """Test that failed writes are logged instead of breaking the update"""
+        self.mock_redis.hset.side_effect = RedisConnectionError("connection refused")
+        self.mock_redis.set.side_effect = RedisConnectionError("connection refused")
+
+        # Verify that neither call raises
+        asyncio.run(self.persistence.update_conversation("amira_conversation", (1, 2), 3))
+        asyncio.run(self.persistence.update_user_data(2, {"language": "ar"}))
+
+if __name__ == '__main__':
+    unittest.main()
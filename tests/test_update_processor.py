@@ -0,0 +1,74 @@
+import unittest
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.update_processor import PerChatUpdateProcessor
+
+def make_update(chat_id):
+    """Build a minimal update from the given chat"""
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id))
+
+class TestPerChatUpdateProcessor(unittest.TestCase):
+    """Test cases for the PerChatUpdateProcessor class"""
+
+    def test_same_chat_in_order(self):
+        """Test that updates from one chat run one at a time, in arrival order"""
+        events = []
+
+        async def handle(name, delay):
+            events.append(f"start {name}")
+            await asyncio.sleep(delay)
+            events.append(f"end {name}")
+
+        async def run():
+            processor = PerChatUpdateProcessor(8)
+            # The first update is the slowest, so overlapping would reorder events
+            await asyncio.gather(
+                processor.process_update(make_update(1), handle("a", 0.03)),
+                processor.process_update(make_update(1), handle("b", 0.01)),
+                processor.process_update(make_update(1), handle("c", 0))
+            )
+            return processor
+
+        processor = asyncio.run(run())
+
+        # Verify the updates did not overlap and kept their order
+        self.assertEqual(events, ["start a", "end a", "start b", "end b", "start c", "end c"])
+
+        # Verify that the chat lock was released
+        self.assertEqual(processor._locks, {})
+
+    def test_other_chats_not_blocked(self):
+        """Test that a chat with a backlog does not hold up other chats"""
+        async def run():
+            # Chat 1 queues updates behind one that only finishes once chat 2
+            # has been handled
+            processor = PerChatUpdateProcessor(8)
+            other_chat_done = asyncio.Event()
+
+            async def wait_for_other_chat():
+                await asyncio.wait_for(other_chat_done.wait(), timeout=1)
+
+            async def noop():
+                pass
+
+            async def other_chat():
+                other_chat_done.set()
+
+            await asyncio.gather(
+                processor.process_update(make_update(1), wait_for_other_chat()),
+                processor.process_update(make_update(1), noop()),
+                processor.process_update(make_update(1), noop()),
+                processor.process_update(make_update(2), other_chat())
+            )
+
+        # Would time out if chat 2 had to wait for chat 1
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()